@@ -1,57 +1,61 @@
 from PyQt5.QtCore import QObject, pyqtSignal
-import ctypes
-import struct
 import hid
-from typing import TYPE_CHECKING
 
-if TYPE_CHECKING:
-    from ui.main_window import MainWindow
+from pipeline.acquisition import Acquisition
+from pipeline.frame_queue import FrameQueue
 
 
 class HIDWorker(QObject):
-    """"Worker object to run in it's own thread to listen to HID reports."""
+    """"Worker object to run in it's own thread to listen to HID reports.
 
-    HID_REPORT_SIZE = 64
+    The reading itself is done by an `Acquisition` loop, which does not depend on
+    Qt. This worker only runs that loop in a `QThread` and turns the arrival of new
+    blocks into a signal.
 
-    # Signal that's fired with a new block of data
-    update = pyqtSignal(int, list)
+    The `update` signal only announces that the queue has data, so the Qt event
+    queue never holds more than one pending update.
+    """
 
-    def __init__(self, device: hid.device):
-        """Constructor."""
-        super().__init__()
-
-        self.device = device
+    HID_REPORT_SIZE = Acquisition.HID_REPORT_SIZE
 
-        self._is_running = True
+    # Signal that's fired when new blocks are available in the (empty) queue
+    update = pyqtSignal()
 
-    def run(self):
-        """Thread function.
+    def __init__(self, device: hid.device, blocking: bool = True,
+                 queue: FrameQueue = None):
+        """Constructor.
 
-        The read that is being performed is non-blocking (configured in device
-        creation). This keeps the thread responsive to the stop flag.
+        :param device: HID device to read from
+        :param blocking: When true, sleep in the read until a report arrives (with a
+            timeout). Otherwise poll with non-blocking reads, which keeps a CPU core
+            busy.
+        :param queue: Queue for the decoded blocks (a default one when `None`)
         """
+        super().__init__()
 
-        self._is_running = True
-
-        while self._is_running:
-            d = self.device.read(self.HID_REPORT_SIZE)
-            if not d:
-                continue  # Empty data
+        self.acquisition = Acquisition(device, blocking, queue)
+        self.acquisition.queue.on_ready = self.update.emit
 
-            channels = d[0]
+    @property
+    def device(self):
+        return self.acquisition.device
 
-            number_bytes = ctypes.sizeof(ctypes.c_long) + channels * ctypes.sizeof(
-                ctypes.c_float)
+    @device.setter
+    def device(self, device):
+        self.acquisition.device = device
 
-            mask = 'L' + (channels * 'f')
-            frame = struct.unpack(mask, bytearray(d[1:(1 + number_bytes)]))
-            micros = frame[0]
-            new_data = list(frame[1:])
+    @property
+    def blocking(self) -> bool:
+        return self.acquisition.blocking
 
-            # self.window.update_data(list(new_data))
+    @property
+    def queue(self) -> FrameQueue:
+        return self.acquisition.queue
 
-            self.update.emit(micros, new_data)
+    def run(self):
+        """Thread function, see `Acquisition.run()`."""
+        self.acquisition.run()
 
     def stop(self):
         """Stop the main loop of this worker."""
-        self._is_running = False
+        self.acquisition.stop()
@@ -0,0 +1,191 @@
+import time
+import numpy as np
+from typing import Optional
+
+from pipeline.report_decoder import ReportDecoder
+
+
+class SyntheticDevice:
+    """Software stand-in for the board, with the read interface of `hid.device`.
+
+    Reports are produced in the exact layout of the firmware (see `ReportDecoder`),
+    at a configurable rate and with any number of channels. The samples are either
+    synthesized EMG or replayed from a recording (looped).
+
+    To test how the rest of the application copes, the timestamps can be given
+    jitter and reports can be dropped, one by one or in bursts. The `micros`
+    counter wraps around like the one on the board.
+
+    Reports are due at fixed times after `open()`. A blocking read sleeps until the
+    next report is due (or the timeout passes), so the device behaves like the
+    real one. With `realtime=False` reports are returned as fast as they are read.
+    """
+
+    NAME = 'synthetic'  # Device name that selects this device in the GUI
+
+    REPORT_SIZE = 64
+    CHUNK = 1024  # Number of reports generated at once
+
+    def __init__(self, rate: float = 750.0, channels: int = 2,
+                 recording: Optional[str] = None, jitter: float = 0.0,
+                 drop_rate: float = 0.0, drop_burst: int = 1, amplitude: float = 1.0,
+                 micros_start: int = 0, realtime: bool = True, seed: Optional[int] = None):
+        """
+
+        :param rate: Reports per second [Hz]
+        :param channels: Number of channels per report
+        :param recording: Recording of raw EMG to replay (synthesized EMG when
+            `None`), its EMG channels are repeated to fill `channels`
+        :param jitter: Standard deviation of the timestamps around the ideal
+            times [s]
+        :param drop_rate: Chance that a report starts a drop
+        :param drop_burst: Number of consecutive reports lost per drop
+        :param amplitude: Scale of the synthesized EMG
+        :param micros_start: Value of the micros counter at the first report
+        :param realtime: When false, reports are never waited for
+        :param seed: Seed for the noise, jitter and drops (random when `None`)
+        """
+
+        self.rate = rate
+        self.channels = channels
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.drop_burst = drop_burst
+        self.amplitude = amplitude
+        self.micros_start = micros_start
+        self.realtime = realtime
+
+        self.random = np.random.default_rng(seed)
+        self.decoder = ReportDecoder(self.REPORT_SIZE)
+        self.dtype = self.decoder.report_dtype(channels)
+
+        self.samples = None  # Samples of the recording, shape (channels, n)
+        if recording is not None:
+            from pipeline.replay import load_recording  # Not needed otherwise
+
+            _, emg, filtered = load_recording(recording, rate)
+            if filtered:
+                raise ValueError('{} holds filtered EMG, the device sends raw EMG'.format(
+                    recording))
+            repeats = -(-channels // emg.shape[0])
+            self.samples = np.tile(emg, (repeats, 1))[:channels, :]
+
+        self.blocking = True
+        self.is_open = False
+        self.reports_sent = 0
+        self.reports_dropped = 0
+
+        self._start = 0.0  # System time of the first report
+        self._index = 0  # Index of the next report, also counting dropped ones
+        self._dropping = 0  # Number of reports still to drop in the current burst
+        self._chunk = b''  # Generated reports that were not read yet
+        self._chunk_index = np.zeros(0, dtype=np.int64)  # Their report indices
+        self._position = 0  # Next report in the chunk
+
+    def open(self, vendor_id: int = 0, product_id: int = 0, serial_number=None):
+        """Start producing reports (the arguments are ignored)."""
+
+        self.is_open = True
+        self._start = time.perf_counter()
+        self._index = 0
+        self._dropping = 0
+        self._chunk = b''
+        self._chunk_index = np.zeros(0, dtype=np.int64)
+        self._position = 0
+
+    def close(self):
+        self.is_open = False
+
+    def set_nonblocking(self, nonblocking) -> int:
+        self.blocking = not nonblocking
+        return 0
+
+    def generate_chunk(self):
+        """Generate the next chunk of reports, without the dropped ones."""
+
+        index = self._index + np.arange(self.CHUNK)
+        self._index += self.CHUNK
+
+        # Drop reports, bursts may continue into the next chunk
+        keep = np.ones(self.CHUNK, dtype=bool)
+        starts = self.random.random(self.CHUNK) < self.drop_rate
+        i = 0
+        while i < self.CHUNK:
+            if self._dropping == 0 and starts[i]:
+                self._dropping = self.drop_burst
+            if self._dropping > 0:
+                stop = min(self.CHUNK, i + self._dropping)
+                keep[i:stop] = False
+                self._dropping -= stop - i
+                i = stop
+            else:
+                next_start = np.flatnonzero(starts[i:])
+                i = self.CHUNK if next_start.size == 0 else i + int(next_start[0])
+
+        self.reports_dropped += int(np.count_nonzero(~keep))
+        index = index[keep]
+
+        t = index / self.rate
+        if self.jitter > 0.0:
+            t = t + self.random.normal(0.0, self.jitter, index.size)
+
+        reports = np.zeros(index.size, dtype=self.dtype)
+        reports['channels'] = self.channels
+        micros = np.round(np.maximum(t, 0.0) * 1.0e6).astype(np.int64) + self.micros_start
+        reports['micros'] = micros % (1 << 32)
+        reports['samples'] = self.sample_values(index).transpose()
+
+        self._chunk = reports.tobytes()
+        self._chunk_index = index
+        self._position = 0
+
+    def sample_values(self, index: np.ndarray) -> np.ndarray:
+        """Get the samples of reports.
+
+        :param index: Report indices
+        :return: Samples, shape (channels, n)
+        """
+
+        if self.samples is not None:
+            return self.samples[:, index % self.samples.shape[1]]
+
+        # Noise bursts, alternating between the channels, plus mains hum
+        t = index / self.rate
+        phase = np.pi * np.arange(self.channels)[:, np.newaxis]
+        envelope = 0.5 * (1.0 + np.sin(2.0 * np.pi * 0.25 * t + phase)) ** 2
+        noise = self.random.normal(0.0, 1.0, (self.channels, index.size))
+        hum = 0.05 * np.sin(2.0 * np.pi * 50.0 * t)
+
+        return self.amplitude * (envelope * noise + hum)
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> list:
+        """Read the next report.
+
+        :param max_length: Maximum number of bytes to return
+        :param timeout_ms: Longest time a blocking read waits for a report (no limit
+            when zero)
+        :return: Report as a list of byte values, empty when none is due
+        """
+
+        if not self.is_open:
+            raise IOError('Device is not open')
+
+        if self._position >= len(self._chunk_index):
+            self.generate_chunk()
+
+        if self.realtime:
+            due = self._start + self._chunk_index[self._position] / self.rate
+            wait = due - time.perf_counter()
+            if wait > 0.0:
+                if not self.blocking:
+                    return []
+                if 0 < timeout_ms < 1000.0 * wait:
+                    time.sleep(0.001 * timeout_ms)
+                    return []
+                time.sleep(wait)
+
+        offset = self._position * self.REPORT_SIZE
+        self._position += 1
+        self.reports_sent += 1
+
+        return list(self._chunk[offset:(offset + min(max_length, self.REPORT_SIZE))])
@@ -3,21 +3,11 @@ from scipy.interpolate import CubicSpline
 from scipy.interpolate import PchipInterpolator
 
 from simulator.muscle_model_base import MuscleModelBase, EmgFilterBase
-from simulator.digital_filter import DigitalFilter
+from simulator.digital_filter import FilterCascade
+from simulator.muscle_set import MuscleSet
 
 import numpy as np
 
-class Muscle:
-    def __init__(self):
-        self.optimal_fibre_length = None
-        self.max_isometric_force = None
-        self.pennation_angle_at_optimal = None
-        self.tendon_slack_length = None
-        self.active_fl = None
-        self.passive_fl = None
-        self.muscle_tendon_length = None
-        self.flexion_moment_arm = None
-
 class ForceLengthRelationship:
     def __init__(self):
         self.x = []
@@ -34,11 +24,17 @@ class MuscleModel(MuscleModelBase):
     Use `self.FS` for the sample frequency.
     """
 
-    def __init__(self):
+    def __init__(self, use_lookup_tables: bool = False, table_resolution: float = 1.0e-3,
+                 table_tolerance: float = 1.0e-4):
         """Constructor (this code is run only once).
 
         The `self.` prefix indicates class properties. Such properties remain the
         same between separate calls to the `update()` method.
+
+        :param use_lookup_tables: When true, replace the splines by precomputed
+            lookup tables (see `build_lookup_tables()`)
+        :param table_resolution: Initial grid step of the lookup tables
+        :param table_tolerance: Maximum relative error of the lookup tables
         """
 
         super().__init__()  # Keep this line
@@ -48,21 +44,6 @@ class MuscleModel(MuscleModelBase):
         #       - active and passive force-length,  angle-length and angle-moment arm
         #       - maximal isometric force and pennation angle for each muscle (flexor and extensor)
 
-        # Create an instance of Muscle
-        FCR = Muscle()
-        ECRL = Muscle()
-
-        # Define muscle properties
-        FCR.optimal_fibre_length = 0.0628
-        FCR.max_isometric_force = 59.7
-        FCR.pennation_angle_at_optimal = 0.05410521
-        FCR.tendon_slack_length = 0.2185
-
-        ECRL.optimal_fibre_length = 0.0936
-        ECRL.max_isometric_force = 65.7
-        ECRL.pennation_angle_at_optimal = 0.04363323
-        ECRL.tendon_slack_length = 0.2026
-
         # Define active and passive force-length relationships
         active_fl = ForceLengthRelationship()
         active_fl.x = [-35, 0, 0.401, 0.402, 0.4035, 0.52725, 0.62875, 0.71875, 0.86125, 1.045, 1.2175, 1.43875, 1.61875, 1.62, 1.621, 2.2, 35]
@@ -76,25 +57,54 @@ class MuscleModel(MuscleModelBase):
         active_fl_spline = PchipInterpolator(active_fl.x, active_fl.y)
         passive_fl_spline = PchipInterpolator(passive_fl.x, passive_fl.y)
 
-        FCR.active_fl = active_fl_spline
-        FCR.passive_fl = passive_fl_spline
-        ECRL.active_fl = active_fl_spline
-        ECRL.passive_fl = passive_fl_spline
-
         angle = [-0.99959767, -0.75278343, -0.50596919, -0.25915495, -0.01234071, 0.23447353, 0.48128776, 0.72810200, 0.97491624, 1.22173048]
-        muscle_tendon_length_ECRL = [ 0.29104195, 0.29376832, 0.29648413, 0.29914435, 0.30170628, 0.30412959, 0.30637666, 0.30841293, 0.31020735, 0.31173271]
-        muscle_tendon_length_FCR = [0.29935362, 0.29641423, 0.29315810, 0.28963728, 0.28590906, 0.28203596, 0.27808623, 0.27413594, 0.27027482, 0.26662228]
-        flexion_moment_arm_ECRL = [-0.01100436, -0.01105605, -0.01092046, -0.01060718, -0.01012554, -0.00948575, -0.00869947, -0.00777998, -0.00674223, -0.00560273]
-        flexion_moment_arm_FCR = [0.01120295, 0.01258428, 0.01376582, 0.01472566, 0.01544287, 0.01589591, 0.01605878, 0.01589178, 0.01531788, 0.01415557]
-        ECRL.muscle_tendon_length = PchipInterpolator(angle, muscle_tendon_length_ECRL)
-        FCR.muscle_tendon_length = PchipInterpolator(angle, muscle_tendon_length_FCR)
-        ECRL.flexion_moment_arm = PchipInterpolator(angle, flexion_moment_arm_ECRL)
-        FCR.flexion_moment_arm = PchipInterpolator(angle, flexion_moment_arm_FCR)
-
-        self.FCR = FCR
-        self.ECRL = ECRL
+
+        # All muscles are stored in a single set and evaluated together, add more
+        # muscles by calling `add()` again
+        muscles = MuscleSet(angle, active_fl_spline, passive_fl_spline)
+
+        # Define muscle properties and geometry
+        muscles.add('ECRL',
+                    optimal_fibre_length=0.0936,
+                    max_isometric_force=65.7,
+                    pennation_angle_at_optimal=0.04363323,
+                    tendon_slack_length=0.2026,
+                    muscle_tendon_length=[0.29104195, 0.29376832, 0.29648413, 0.29914435, 0.30170628, 0.30412959, 0.30637666, 0.30841293, 0.31020735, 0.31173271],
+                    flexion_moment_arm=[-0.01100436, -0.01105605, -0.01092046, -0.01060718, -0.01012554, -0.00948575, -0.00869947, -0.00777998, -0.00674223, -0.00560273],
+                    emg_channel=0,
+                    activation_shape=-0.001)
+
+        muscles.add('FCR',
+                    optimal_fibre_length=0.0628,
+                    max_isometric_force=59.7,
+                    pennation_angle_at_optimal=0.05410521,
+                    tendon_slack_length=0.2185,
+                    muscle_tendon_length=[0.29935362, 0.29641423, 0.29315810, 0.28963728, 0.28590906, 0.28203596, 0.27808623, 0.27413594, 0.27027482, 0.26662228],
+                    flexion_moment_arm=[0.01120295, 0.01258428, 0.01376582, 0.01472566, 0.01544287, 0.01589591, 0.01605878, 0.01589178, 0.01531788, 0.01415557],
+                    emg_channel=1,
+                    activation_shape=-0.002)
+
+        self.muscles = muscles
         self.emg_scale = 1.0  # Example of a property in Python
 
+        if use_lookup_tables:
+            self.build_lookup_tables(table_resolution, table_tolerance)
+
+    def build_lookup_tables(self, resolution: float = 1.0e-3, tolerance: float = 1.0e-4):
+        """Replace the splines of the muscles by uniformly sampled lookup tables.
+
+        Each spline becomes a handful of array reads per evaluation. The angle
+        tables cover +/- 90 degrees, the force-length tables cover normalized
+        lengths up to 2.5; inputs outside of that are clamped.
+
+        :param resolution: Initial grid step (in [rad] or normalized length)
+        :param tolerance: Maximum error, relative to the peak value of each curve
+        """
+
+        self.muscles.build_lookup_tables(angle_range=(-0.5 * np.pi, 0.5 * np.pi),
+                                         length_range=(0.0, 2.5),
+                                         resolution=resolution, tolerance=tolerance)
+
     def update(self, angle: float, emg1: float, emg2: float) -> float:
         """Compute the next step in the muscle_model.
 
@@ -106,42 +116,29 @@ class MuscleModel(MuscleModelBase):
 
         angle = angle / 180 * np.pi
 
-        ECRL = self.ECRL
-        FCR = self.FCR
-
-        ECRL_activation = self.muscle_activation(emg1, -0.001)
-        FCR_activation = self.muscle_activation(emg2, -0.002)
-
-        ECRL_force = self.muscle_tendon_force(ECRL, ECRL_activation, angle)
-        FCR_force = self.muscle_tendon_force(FCR, FCR_activation, angle)
-
-        torque = ECRL_force * ECRL.flexion_moment_arm(angle) + FCR_force * FCR.flexion_moment_arm(angle)
+        torque = self.muscles.torque(angle, np.array([emg1, emg2]))
 
         # Simply take EMG as proportional to torque
         # return (emg1 - emg2) / self.emg_scale
         return torque
-    
-    def muscle_activation(self, u, A):
-        return (np.exp(A * u / 1) - 1) / (np.exp(A) - 1)
 
-    def muscle_tendon_force(self, muscle: Muscle, activation, angle):
-        lt = muscle.tendon_slack_length
-        lo = muscle.optimal_fibre_length
-        phi_o = muscle.pennation_angle_at_optimal
-        lmt = muscle.muscle_tendon_length(angle)
-        lm = np.sqrt((lo * np.sin(phi_o)) ** 2 + (lmt - lt) ** 2)
+    def update_batch(self, angles: np.ndarray, emg1: np.ndarray,
+                     emg2: np.ndarray) -> np.ndarray:
+        """Compute the muscle_model for many samples at once.
+
+        All operations in `update()` work element-wise on arrays, so the batch
+        is simply passed through it in one go.
 
-        fA = muscle.active_fl
-        fP = muscle.passive_fl
-        Fmax = muscle.max_isometric_force
-        FA = fA(lm/lo) * Fmax * activation
-        FP = fP(lm/lo) * Fmax
-        Fm = FA + FP
+        :param angles: The angles of the wrist
+        :param emg1: Filtered EMG (channel 0)
+        :param emg2: Filtered EMG (channel 1)
+        :return: Torques [Nm], in the broadcast shape of the inputs
+        """
 
-        phi = np.arcsin((lo * np.sin(phi_o)) / lm)
-        Fmt = Fm * np.cos(phi)
+        angles, emg1, emg2 = np.broadcast_arrays(np.asarray(angles, dtype=float),
+                                                 emg1, emg2)
 
-        return Fmt
+        return np.asarray(self.update(angles, emg1, emg2), dtype=float)
 
 
 class EmgFilter(EmgFilterBase):
@@ -163,31 +160,32 @@ class EmgFilter(EmgFilterBase):
         The `self.` prefix indicates class properties. Such properties remain the
         same between separate calls to the `update()` method.
 
-        Note: don't use the same filter object for more than one signal! The filter
-        object contains the filter state, which should be unique per signal.
+        The notch, high-pass, rectifier and low-pass stages are combined in a single
+        filter cascade. The cascade holds the state of both EMG channels, so a
+        single `sample()` call advances both signals through the whole chain.
         """
 
         self.MVC1 = 0.18
         self.MVC2 = 0.065
+        self.MVC = np.array([self.MVC1, self.MVC2])
 
         fnotch = 50
         Qnotch = 2
         notch_b, notch_a = signal.iirnotch(fnotch, Qnotch, self.FS)
+        notch_sos = signal.tf2sos(notch_b, notch_a)
 
         fhighpass = 15
         highpass_wc = fhighpass / (self.FS / 2)
-        highpass_b, highpass_a = signal.butter(2, highpass_wc, btype='high')
+        highpass_sos = signal.butter(2, highpass_wc, btype='high', output='sos')
 
         flowpass = 1.6
         lowpass_wc = flowpass / (self.FS / 2)
-        lowpass_b, lowpass_a = signal.butter(2, lowpass_wc, btype='low')
+        lowpass_sos = signal.butter(2, lowpass_wc, btype='low', output='sos')
 
-        self.notch_filter1 = DigitalFilter(notch_b, notch_a)
-        self.highpass_filter1 = DigitalFilter(highpass_b, highpass_a)
-        self.lowpass_filter1 = DigitalFilter(lowpass_b, lowpass_a)
-        self.notch_filter2 = DigitalFilter(notch_b, notch_a)
-        self.highpass_filter2 = DigitalFilter(highpass_b, highpass_a)
-        self.lowpass_filter2 = DigitalFilter(lowpass_b, lowpass_a)
+        # Notch and high-pass are fused into one linear segment, the rectifier
+        # breaks the chain before the low-pass
+        self.filter = FilterCascade([notch_sos, highpass_sos, np.abs, lowpass_sos],
+                                    channels=2)
 
     def update(self, emg1: float, emg2: float) -> (float, float):
         """Filter EMG signal.
@@ -197,7 +195,18 @@ class EmgFilter(EmgFilterBase):
         :return: Both filtered values
         """
 
-        emg1_filtered = self.lowpass_filter1.sample(np.abs(self.highpass_filter1.sample(self.notch_filter1.sample(emg1)))) / self.MVC1
-        emg2_filtered = self.lowpass_filter2.sample(np.abs(self.highpass_filter2.sample(self.notch_filter2.sample(emg2)))) / self.MVC2
+        emg = self.filter.sample([emg1, emg2]) / self.MVC
+
+        return emg[0], emg[1]
+
+    def update_batch(self, emg1: np.ndarray, emg2: np.ndarray) -> (np.ndarray, np.ndarray):
+        """Filter a block of EMG samples.
+
+        :param emg1: Unfiltered EMG (channel 0), oldest sample first
+        :param emg2: Unfiltered EMG (channel 1), oldest sample first
+        :return: Both filtered signals
+        """
+
+        emg = self.filter.sample_block(np.vstack((emg1, emg2))) / self.MVC[:, np.newaxis]
 
-        return emg1_filtered, emg2_filtered
+        return emg[0], emg[1]
@@ -0,0 +1,79 @@
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+import numpy as np
+from typing import Optional
+
+from pipeline.frame_queue import FrameQueue
+from pipeline.model_pipeline import ModelPipeline
+from pipeline.recorder import Recorder
+from pipeline.resampler import Resampler
+from pipeline.session import Session
+from pipeline.tiered_history import TieredHistory
+
+
+class ModelWorker(QObject):
+    """Worker object to run the model pipeline in its own thread.
+
+    The processing itself is done by a `Session`, which does not depend on Qt. This
+    worker turns its callbacks into signals and offers its methods as slots, so
+    the GUI can drive it through queued connections.
+    """
+
+    # Signal that's fired with the new angle and target of the hand
+    state = pyqtSignal(float, float)
+
+    # Signal that's fired when a block has an unexpected number of channels
+    channels_error = pyqtSignal(int)
+
+    def __init__(self, queue: FrameQueue, history_size: int = 200):
+        """Constructor.
+
+        :param queue: Queue with blocks of raw frames (e.g. from the `HIDWorker`)
+        :param history_size: Number of output frames to keep at full rate
+        """
+        super().__init__()
+
+        self.session = Session(queue, history_size, on_state=self.state.emit,
+                               on_channels_error=self.channels_error.emit)
+
+    @property
+    def pipeline(self) -> ModelPipeline:
+        return self.session.pipeline
+
+    @property
+    def history(self) -> TieredHistory:
+        return self.session.history
+
+    @property
+    def history_size(self) -> int:
+        return self.session.history_size
+
+    @property
+    def resampler(self) -> Resampler:
+        return self.session.resampler
+
+    @pyqtSlot(int)
+    def reset(self, history_size: int):
+        """Start a new recording, see `Session.reset()`.
+
+        Call this through a queued signal, so it is ordered with the blocks that
+        are still waiting to be processed.
+        """
+        self.session.reset(history_size)
+
+    @pyqtSlot(object)
+    def set_recorder(self, recorder: Optional[Recorder]):
+        """Replace the recorder, see `Session.set_recorder()`.
+
+        Call this through a queued signal, so no block is processed while the
+        recorder is replaced.
+        """
+        self.session.set_recorder(recorder)
+
+    def latest(self, n: int = None) -> np.ndarray:
+        """Get a view of the most recent history, see `Session.latest()`."""
+        return self.session.latest(n)
+
+    @pyqtSlot()
+    def process_queue(self):
+        """Process all blocks that are waiting in the queue."""
+        self.session.process_queue()
@@ -0,0 +1,168 @@
+"""Run a live session without the GUI.
+
+Run from the root of the repository, e.g.:
+
+    python -m pipeline --device mbed --record session.bin
+
+Reports are read from the HID device, run through the models and optionally
+streamed to a recording, until the duration has passed or Ctrl+C is pressed. Qt is
+not needed.
+
+Without hardware, `--synthetic` reads from a `SyntheticDevice` instead. Normally
+all frames are resampled to the 750 Hz of the models. To find the highest rate
+the models keep up with, run them on every frame with `--no-resample`:
+
+    python -m pipeline --synthetic --rate 10000 --no-resample --duration 30
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from hid_worker.synthetic_device import SyntheticDevice
+from pipeline.acquisition import Acquisition, find_device
+from pipeline.model_version import model_hash
+from pipeline.frame_queue import FrameQueue
+from pipeline.recorder import Recorder
+from pipeline.session import Session
+
+
+def run_session(device, args) -> Session:
+    """Run a session on an opened device, until the duration has passed.
+
+    :param device: Device to read reports from
+    :param args: Parsed command line arguments
+    :return: The finished session
+    """
+
+    queue = FrameQueue(args.backlog_size, args.backlog_policy)
+    acquisition = Acquisition(device, not args.poll, queue)
+    reported = set()
+
+    def on_channels_error(channels: int):
+        if channels not in reported:  # Once, not for every block
+            reported.add(channels)
+            print('Ignoring reports with {} channels, the models need 2'.format(channels),
+                  file=sys.stderr, flush=True)
+
+    session = Session(queue, args.history, on_channels_error=on_channels_error,
+                      source_rate=args.rate, resample=not args.no_resample)
+
+    if args.record:
+        recorder = Recorder(args.record, session.pipeline.CHANNELS, session.frame_rate,
+                            model_hash()[:16])
+        recorder.start()
+        session.set_recorder(recorder)
+
+    session_thread = threading.Thread(target=session.run, name='Session')
+    session_thread.start()
+    acquisition.start()
+
+    start = time.perf_counter()
+    try:
+        while args.duration is None or time.perf_counter() - start < args.duration:
+            time.sleep(args.interval)
+            print_status(session, queue, time.perf_counter() - start)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        acquisition.stop()
+        acquisition.join()
+        session.stop()
+        session_thread.join()
+        session.process_queue()  # Blocks that came in after the last check
+        session.set_recorder(None)
+
+    return session
+
+
+def print_status(session: Session, queue: FrameQueue, elapsed: float):
+    """Print a single line with the state of a session."""
+
+    stats = queue.stats()
+    timing = session.resampler.stats()
+    latest = session.latest(1)
+    angle = latest[4, 0] if latest.shape[1] > 0 else 0.0
+
+    recorded = ''
+    if session.recorder is not None:
+        recorded = ' | Recorded: {}'.format(session.recorder.frames_written)
+
+    print('{:7.1f} s | Frames: {} ({:.0f}/s) | Angle: {:6.1f} | Backlog: {} (dropped {}) '
+          '| Gaps: {} ({} missing) | Jitter: {:.0f} us{}'.format(
+              elapsed, timing['frames_out'], timing['frames_out'] / max(elapsed, 1e-9),
+              angle, stats['frames'], stats['dropped_frames'], timing['gaps'],
+              timing['missing_frames'], 1.0e6 * timing['jitter'], recorded), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the models on a live HID device '
+                                                 'without the GUI.')
+    parser.add_argument('--device', default='mbed',
+                        help='Text to search for the HID device')
+    parser.add_argument('--record', help='Stream all output to this file (.csv or .bin)')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    parser.add_argument('--history', type=int, default=7500,
+                        help='Number of frames kept at full rate')
+    parser.add_argument('--backlog-size', type=int, default=64,
+                        help='Maximum number of queued blocks')
+    parser.add_argument('--backlog-policy', choices=FrameQueue.POLICIES,
+                        default='drop_oldest', help='What to do when the models fall '
+                                                    'behind')
+    parser.add_argument('--poll', action='store_true',
+                        help='Use non-blocking reads (keeps a CPU core busy)')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Time between status lines [s]')
+    parser.add_argument('--synthetic', nargs='?', const='', metavar='RECORDING',
+                        help='Read from a synthetic device instead, with synthesized '
+                             'EMG or replaying a recording')
+    parser.add_argument('--rate', type=float, default=750.0,
+                        help='Report rate of the device, gaps and jitter are measured '
+                             'against it (also sets the synthetic device) [Hz]')
+    parser.add_argument('--no-resample', action='store_true',
+                        help='Run the models on every report at the device rate, for '
+                             'load tests (the filters assume 750 Hz)')
+    parser.add_argument('--channels', type=int, default=2,
+                        help='Channels of the synthetic device')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Timestamp jitter of the synthetic device [s]')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='Chance that the synthetic device starts dropping reports')
+    parser.add_argument('--drop-burst', type=int, default=1,
+                        help='Reports lost per drop of the synthetic device')
+    args = parser.parse_args()
+
+    if args.synthetic is not None:
+        device = SyntheticDevice(args.rate, args.channels, args.synthetic or None,
+                                 args.jitter, args.drop_rate, args.drop_burst)
+        device.open()
+        device.set_nonblocking(args.poll)
+
+        try:
+            run_session(device, args)
+        finally:
+            device.close()
+        print('Synthetic device sent {} reports ({} dropped)'.format(
+            device.reports_sent, device.reports_dropped))
+        return
+
+    import hid  # Only needed for real devices
+
+    device_tuple = find_device(args.device)
+    if device_tuple is None:
+        sys.exit('No HID device with a name containing `{}` was found'.format(
+            args.device))
+
+    device = hid.device()
+    device.open(*device_tuple)
+    device.set_nonblocking(args.poll)
+
+    try:
+        run_session(device, args)
+    finally:
+        device.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+from pipeline.report_decoder import ReportDecoder
+from pipeline.frame_queue import FrameQueue
+
+
+def find_device(name: str) -> Optional[Tuple[int, int]]:
+    """Get the vendor and product id of the first HID device that matches a name."""
+
+    import hid  # Only needed for real devices
+
+    for device_dict in hid.enumerate():
+        if name in device_dict['manufacturer_string']:
+            return device_dict['vendor_id'], device_dict['product_id']
+
+    return None
+
+
+class Acquisition:
+    """Loop that reads HID reports and queues them as decoded blocks.
+
+    Reports are not passed on one by one. They are gathered into blocks, which are
+    queued once enough frames were collected or once the oldest frame in the block
+    has waited for long enough.
+
+    Raw reports are copied into a preallocated buffer and the whole block is
+    decoded at once when it is queued.
+
+    Blocks are put in a bounded `FrameQueue`, which decides what happens when the
+    consumer falls behind.
+
+    This class does not depend on Qt. Call `run()` from a thread of your own, or
+    use `start()` to run it in a new thread.
+    """
+
+    HID_REPORT_SIZE = 64
+
+    BLOCK_SIZE = 32  # Maximum number of frames per block
+    BLOCK_TIME = 0.010  # [s], maximum time a frame waits before it is queued
+
+    READ_TIMEOUT = 0.050  # [s], longest time a blocking read waits for a report
+
+    def __init__(self, device, blocking: bool = True, queue: Optional[FrameQueue] = None):
+        """
+
+        :param device: HID device to read from (e.g. a `hid.device`)
+        :param blocking: When true, sleep in the read until a report arrives (with a
+            timeout). Otherwise poll with non-blocking reads, which keeps a CPU core
+            busy.
+        :param queue: Queue for the decoded blocks (a default one when `None`)
+        """
+
+        self.device = device
+        self.blocking = blocking
+
+        if queue is None:
+            queue = FrameQueue()
+        self.queue = queue
+
+        self._is_running = True
+        self._thread = None
+
+        self.decoder = ReportDecoder(self.HID_REPORT_SIZE)
+
+        # Raw reports of the current block
+        self._buffer = bytearray(self.BLOCK_SIZE * self.HID_REPORT_SIZE)
+        self._count = 0  # Number of reports in the buffer
+        self._block_start = 0.0  # System time of the first frame in the block
+
+    def start(self):
+        """Run the loop in a new thread."""
+
+        self._is_running = True  # Before the thread starts, so `stop()` always works
+        self._thread = threading.Thread(target=self.run, name='Acquisition', daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None):
+        """Wait for the thread of `start()` to finish."""
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        """Main loop, until `stop()` is called.
+
+        In blocking mode the read waits for a report, but never longer than
+        `READ_TIMEOUT` or until the current block is due. This keeps the loop
+        responsive to the stop flag while it sleeps in between reports.
+
+        Otherwise the read is non-blocking (configured in device creation) and the
+        loop spins.
+        """
+
+        self._is_running = True
+
+        while self._is_running:
+            if self.blocking:
+                d = self.device.read(self.HID_REPORT_SIZE, self.read_timeout_ms())
+            else:
+                d = self.device.read(self.HID_REPORT_SIZE)
+            if not d:
+                if self._count > 0 and \
+                        time.perf_counter() - self._block_start >= self.BLOCK_TIME:
+                    self.emit_block()
+                continue  # Empty data
+
+            if self._count > 0 and self._buffer[0] != d[0]:
+                self.emit_block()  # Never mix channel counts in a block
+
+            if self._count == 0:
+                self._block_start = time.perf_counter()
+
+            offset = self._count * self.HID_REPORT_SIZE
+            self._buffer[offset:(offset + len(d))] = bytes(d)
+            self._count += 1
+
+            if self._count >= self.BLOCK_SIZE or \
+                    time.perf_counter() - self._block_start >= self.BLOCK_TIME:
+                self.emit_block()
+
+        if self._count > 0:
+            self.emit_block()  # Don't lose the last frames
+
+    def read_timeout_ms(self) -> int:
+        """Time a blocking read may take before the current block must be queued."""
+
+        timeout = self.READ_TIMEOUT
+        if self._count > 0:
+            remaining = self.BLOCK_TIME - (time.perf_counter() - self._block_start)
+            timeout = min(timeout, remaining)
+
+        return max(1, int(round(1000.0 * timeout)))  # Zero would not block at all
+
+    def emit_block(self):
+        """Decode the collected reports as a single block and queue them."""
+
+        micros, samples = self.decoder.decode_block(self._buffer, self._count)
+
+        self._count = 0
+
+        # Only the 'block' policy can refuse, keep trying unless we are stopping
+        queued = self.queue.put(micros, samples, self.READ_TIMEOUT)
+        while not queued and self._is_running:
+            queued = self.queue.put(micros, samples, self.READ_TIMEOUT)
+
+    def stop(self):
+        """Stop the main loop."""
+        self._is_running = False
@@ -0,0 +1,152 @@
+"""Replay many recordings in parallel, skipping unchanged combinations.
+
+Run from the root of the repository, e.g.:
+
+    python -m pipeline.batch data/
+
+Results are cached per combination of recording and model source, so after a
+change to the model only the affected recordings are evaluated again.
+"""
+
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
+from pipeline.model_pipeline import ModelPipeline
+from pipeline.model_version import ROOT, file_hash, model_hash
+from pipeline.replay import load_recording, replay, save_recording
+
+CACHE_DIR = os.path.join(ROOT, '.cache', 'replay')
+
+RECORDING_EXTENSIONS = ('.csv', '.npz', '.bin')
+
+
+def cache_key(filename: str, model_key: str, seed: int) -> str:
+    """Key for the result of replaying a recording with a model."""
+
+    hasher = file_hash(filename)
+    hasher.update(model_key.encode())
+    hasher.update(str(seed).encode())
+
+    return hasher.hexdigest()
+
+
+def find_recordings(paths: List[str]) -> List[str]:
+    """List the recordings in the given files and directories."""
+
+    recordings = []
+    for path in paths:
+        if os.path.isdir(path):
+            for extension in RECORDING_EXTENSIONS:
+                recordings += glob.glob(os.path.join(path, '*' + extension))
+        else:
+            recordings.append(path)
+
+    # Skip earlier replay outputs
+    return sorted(r for r in recordings
+                  if not os.path.splitext(r)[0].endswith('_replay'))
+
+
+def replay_file(filename: str, cache_file: str, seed: int) -> float:
+    """Replay a single recording and store the result in the cache.
+
+    This runs inside a worker process.
+
+    :return: Duration of the replay [s]
+    """
+
+    start = time.perf_counter()
+
+    pipeline = ModelPipeline(seed=seed)
+    time_data, emg, filtered = load_recording(filename, pipeline.muscle_model.FS)
+    data = replay(time_data, emg, pipeline, filtered=filtered)
+
+    # Write under a temporary name first, so an interrupted run cannot leave a
+    # partial result behind
+    temp_file = cache_file + '.tmp.npz'
+    np.savez(temp_file, time=time_data.reshape(1, -1), data=data)
+    os.replace(temp_file, cache_file)
+
+    return time.perf_counter() - start
+
+
+def run_batch(recordings: List[str], cache_dir: str = CACHE_DIR, seed: int = 0,
+              workers: Optional[int] = None, output_dir: Optional[str] = None) -> dict:
+    """Replay recordings in parallel processes, reusing cached results.
+
+    :param recordings: Recordings to replay
+    :param cache_dir: Directory in which results are cached
+    :param seed: Seed for the target generation
+    :param workers: Number of worker processes (number of cores when `None`)
+    :param output_dir: When set, also export each result as CSV to this directory
+    :return: Dictionary with the cache file of each recording
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    model_key = model_hash()
+
+    results = {}
+    todo = {}
+    for filename in recordings:
+        key = cache_key(filename, model_key, seed)
+        cache_file = os.path.join(cache_dir, key + '.npz')
+        results[filename] = cache_file
+        if os.path.isfile(cache_file):
+            print('Cached:   {}'.format(filename))
+        else:
+            todo[filename] = cache_file
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(replay_file, filename, cache_file, seed): filename
+                       for filename, cache_file in todo.items()}
+
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    duration = future.result()
+                except Exception as err:
+                    print('Failed:   {} ({})'.format(filename, err))
+                    del results[filename]
+                    continue
+                print('Replayed: {} in {:.2f} s'.format(filename, duration))
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        for filename, cache_file in results.items():
+            name = os.path.splitext(os.path.basename(filename))[0]
+            with np.load(cache_file) as result:
+                save_recording(os.path.join(output_dir, name + '_replay.csv'),
+                               result['time'], result['data'])
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay all recordings through the '
+                                                 'models, in parallel and skipping '
+                                                 'unchanged results.')
+    parser.add_argument('paths', nargs='*', default=['data'],
+                        help='Recordings or directories with recordings')
+    parser.add_argument('-o', '--output-dir', help='Export the results as CSV to this '
+                                                   'directory')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of worker processes')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='Result cache directory')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the target generation')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(find_recordings(args.paths), cache_dir=args.cache_dir,
+                        seed=args.seed, workers=args.jobs, output_dir=args.output_dir)
+    print('Finished {} recordings in {:.2f} s'.format(
+        len(results), time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Fast loading of the delimited text recordings, with a binary cache.
+
+The recordings in `data/` come in a few dialects: `,` or `;` separated, with or
+without a `#` header line, and some with locale-garbled numbers (see
+`parse_number()`). `load_columns()` detects the dialect, parses the text in large
+chunks straight into a float array and stores the result next to the other caches
+in `.cache/` of the repository, wherever it is run from. As long as the size and
+modification time of the text file do not change, later loads only map the cached
+array.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import numpy as np
+from typing import List, NamedTuple, Optional
+
+from pipeline.model_version import ROOT
+
+CACHE_DIR = os.path.join(ROOT, '.cache', 'csv')
+
+CHUNK_SIZE = 1 << 22  # Number of characters parsed at once
+
+GARBLED = re.compile(r'\.[0-9]*\.')  # Number with more than one dot
+
+
+class Dialect(NamedTuple):
+    delimiter: str
+    header: Optional[List[str]]  # Column names, `None` when there is no header
+    columns: int
+
+
+def parse_number(text) -> float:
+    """Parse a number, also when a locale added thousands separators.
+
+    Some recordings were re-saved with e.g. `2.790346` written as `2.790.346`. Only
+    the first dot is the decimal separator.
+    """
+
+    if isinstance(text, bytes):
+        text = text.decode()
+
+    head, separator, tail = text.partition('.')
+    return float(head + separator + tail.replace('.', ''))
+
+
+def detect_dialect(filename: str) -> Dialect:
+    """Find the delimiter, header and number of columns of a text recording."""
+
+    header = None
+    with open(filename, 'r') as file:
+        line = file.readline()
+        while line.startswith('#'):
+            header = line
+            line = file.readline()
+
+    delimiter = ';' if ';' in line else ','
+    columns = len(line.split(delimiter))
+
+    if header is not None:
+        header = [name.strip() for name in re.split('[,;]', header.lstrip('#'))]
+
+    return Dialect(delimiter, header, columns)
+
+
+def parse_chunk(text: str, dialect: Dialect) -> np.ndarray:
+    """Parse complete lines of text.
+
+    :return: Values of shape (lines, columns)
+    """
+
+    if GARBLED.search(text) is None:
+        text = text.replace(dialect.delimiter, ' ')
+        values = np.fromstring(text, sep=' ')
+    else:  # Rare, fall back to parsing every number
+        values = np.array([parse_number(value) for value in
+                           text.replace(dialect.delimiter, ' ').split()])
+
+    if values.size % dialect.columns:
+        raise ValueError('Lines do not all have {} columns'.format(dialect.columns))
+
+    return values.reshape(-1, dialect.columns)
+
+
+def parse_file(filename: str, dialect: Optional[Dialect] = None) -> np.ndarray:
+    """Parse a text recording without any caching.
+
+    :param filename: Path to the recording
+    :param dialect: Format of the file (detected when `None`)
+    :return: Values of shape (columns, n)
+    """
+
+    if dialect is None:
+        dialect = detect_dialect(filename)
+
+    chunks = []
+    with open(filename, 'r') as file:
+        while True:
+            lines = file.readlines(CHUNK_SIZE)
+            if not lines:
+                break
+
+            lines = [line for line in lines if not line.startswith('#')]
+            if lines:
+                chunks.append(parse_chunk(''.join(lines), dialect))
+
+    if not chunks:
+        return np.zeros((dialect.columns, 0))
+
+    return np.ascontiguousarray(np.vstack(chunks).transpose())
+
+
+def cache_file(filename: str) -> str:
+    """Path of the cached array of a text recording.
+
+    The path depends on the absolute path, size and modification time of the file,
+    so an edited file never matches an old cache.
+    """
+
+    stat = os.stat(filename)
+    key = hashlib.sha256(os.path.abspath(filename).encode()).hexdigest()[:32]
+
+    return os.path.join(CACHE_DIR, '{}-{}-{}.npy'.format(
+        key, stat.st_size, stat.st_mtime_ns))
+
+
+def load_columns(filename: str, use_cache: bool = True) -> np.ndarray:
+    """Load all columns of a text recording, through the cache.
+
+    :param filename: Path to the recording
+    :param use_cache: Read and write the binary cache
+    :return: Values of shape (columns, n), read-only when it comes from the cache
+    """
+
+    if not use_cache:
+        return parse_file(filename)
+
+    cached = cache_file(filename)
+    if os.path.isfile(cached):
+        return np.load(cached, mmap_mode='r')
+
+    columns = parse_file(filename)
+
+    # Older caches of the same file are outdated now
+    prefix = os.path.basename(cached).split('-')[0]
+    for old in glob.glob(os.path.join(CACHE_DIR, prefix + '-*.npy')):
+        os.remove(old)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_file = cached + '.tmp.npy'  # Write separately, so the cache is never partial
+    np.save(temp_file, columns)
+    os.replace(temp_file, cached)
+
+    return columns
@@ -0,0 +1,102 @@
+import numpy as np
+
+from pipeline.sample_ring import SampleRing
+
+
+class MinMaxDecimator:
+    """Reduce a window of samples to a min/max envelope for plotting.
+
+    The window is split into buckets of equal size, about one per horizontal pixel.
+    Each bucket is drawn as its minimum and its maximum, so short spikes remain
+    visible no matter how many samples are in the window.
+
+    Buckets are aligned to the absolute sample index, so completed buckets never
+    change. They are cached and only the buckets that were completed since the
+    previous frame are computed, plus the unfinished bucket at the end. The cost
+    of a frame depends on the plot width instead of the number of samples.
+    """
+
+    def __init__(self):
+        self._ring = None  # Ring the cache belongs to
+        self._bucket_size = 0
+
+        # Cached buckets, bucket `k` is stored at `k % capacity`
+        self._time = np.zeros(0)
+        self._min = np.zeros((0, 0))
+        self._max = np.zeros((0, 0))
+        self._next = 0  # Index of the first bucket that is not cached yet
+        self._first = 0  # Index of the oldest cached bucket
+
+    def decimate(self, ring: SampleRing, n: int, width: int) -> np.ndarray:
+        """Get the decimated window of the most recent samples.
+
+        The first row of the ring is used as time, the other rows are decimated.
+
+        :param ring: Source of the samples
+        :param n: Number of recent samples in the window
+        :param width: Number of horizontal pixels available
+        :return: Time and channels, shape (rows, m) with m about `2 * width`, or
+            the plain window when it already fits
+        """
+
+        head = ring.head
+        n = min(n, len(ring))
+        width = max(width, 1)
+
+        bucket_size = -(-n // width)  # Ceiling division
+        if bucket_size <= 2:
+            return ring.latest(n)
+
+        capacity = width + 2  # Enough buckets for a full window
+
+        if ring is not self._ring or bucket_size != self._bucket_size or \
+                capacity != self._time.size or head < self._next * bucket_size:
+            # Start over
+            self._ring = ring
+            self._bucket_size = bucket_size
+            self._time = np.zeros(capacity)
+            self._min = np.zeros((ring.rows - 1, capacity))
+            self._max = np.zeros((ring.rows - 1, capacity))
+            self._next = 0
+            self._first = 0
+
+        first = -(-(head - n) // bucket_size)  # First bucket fully inside the window
+        last = head // bucket_size  # Bucket that is not complete yet
+
+        if first < self._first:  # Window grew beyond the cache, compute it again
+            self._next = first
+
+        # Compute the newly completed buckets
+        start = max(self._next, first, last - capacity)
+        if start < last:
+            samples = ring.view(start * bucket_size, last * bucket_size)
+            buckets = samples.reshape(ring.rows, last - start, bucket_size)
+
+            index = np.arange(start, last) % capacity
+            self._time[index] = buckets[0, :, 0]
+            self._min[:, index] = np.min(buckets[1:, :, :], axis=2)
+            self._max[:, index] = np.max(buckets[1:, :, :], axis=2)
+
+        if start != self._next:
+            self._first = start  # There is a gap, older buckets are invalid
+        self._next = last
+
+        first = max(first, self._first, last - capacity)
+        index = np.arange(first, last) % capacity
+        count = len(index)
+
+        # Interleave minimum and maximum of each bucket
+        has_tail = head > last * bucket_size
+        output = np.zeros((ring.rows, 2 * (count + has_tail)))
+        output[0, 0:(2 * count):2] = self._time[index]
+        output[0, 1:(2 * count):2] = self._time[index]
+        output[1:, 0:(2 * count):2] = self._min[:, index]
+        output[1:, 1:(2 * count):2] = self._max[:, index]
+
+        if has_tail:  # The unfinished bucket is computed again every frame
+            tail = ring.view(last * bucket_size, head)
+            output[0, -2:] = tail[0, 0]
+            output[1:, -2] = np.min(tail[1:, :], axis=1)
+            output[1:, -1] = np.max(tail[1:, :], axis=1)
+
+        return output
@@ -0,0 +1,154 @@
+import threading
+import time
+import numpy as np
+from typing import Callable, Optional
+
+
+class FrameQueue:
+    """Bounded queue of frame blocks between acquisition and processing.
+
+    When the consumer falls behind, the queue never grows beyond `max_blocks`
+    blocks. What happens to new blocks when it is full depends on the policy:
+
+     * `'block'`: the producer waits until there is room again
+     * `'drop_oldest'`: the oldest queued block is discarded
+     * `'coalesce'`: the new block is merged into the newest queued block, so
+       nothing is lost but the consumer handles the backlog in fewer, larger blocks.
+       Once `max_queued_frames` frames are queued, or when a block has a different
+       number of channels, the oldest block is discarded instead.
+
+    The queue keeps counters of its depth, dropped frames and the worst time a
+    block waited, see `stats()`.
+    """
+
+    POLICIES = ('block', 'drop_oldest', 'coalesce')
+
+    def __init__(self, max_blocks: int = 64, policy: str = 'drop_oldest',
+                 on_ready: Optional[Callable[[], None]] = None,
+                 max_queued_frames: int = 16384):
+        """
+
+        :param max_blocks: Maximum number of queued blocks
+        :param policy: Overload policy, one of `POLICIES`
+        :param on_ready: Called (from the producer thread) when a block is put in an
+            empty queue, use this to wake up the consumer
+        :param max_queued_frames: Number of queued frames above which the `'coalesce'`
+            policy stops merging and drops blocks, this bounds memory and latency
+        """
+
+        if policy not in self.POLICIES:
+            raise ValueError('Unknown overload policy `{}`'.format(policy))
+
+        self.max_blocks = max_blocks
+        self.policy = policy
+        self.on_ready = on_ready
+        self.max_queued_frames = max_queued_frames
+
+        self._condition = threading.Condition()
+        self._blocks = []  # [micros, samples, enqueue time]
+        self._frames = 0  # Number of frames in all queued blocks
+
+        self.reset_stats()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def reset_stats(self):
+        """Reset the counters."""
+
+        self.max_frames = 0  # Largest number of frames queued at once
+        self.dropped_frames = 0
+        self.coalesced_blocks = 0
+        self.worst_age = 0.0  # [s], longest time a block waited in the queue
+
+    def stats(self) -> dict:
+        """Get the current depth and the counters."""
+
+        with self._condition:
+            age = 0.0
+            if self._blocks:
+                age = time.perf_counter() - self._blocks[0][2]
+
+            return {
+                'blocks': len(self._blocks),
+                'frames': self._frames,
+                'age': age,
+                'max_frames': self.max_frames,
+                'dropped_frames': self.dropped_frames,
+                'coalesced_blocks': self.coalesced_blocks,
+                'worst_age': max(self.worst_age, age),
+            }
+
+    def clear(self):
+        """Discard all queued blocks (not counted as dropped)."""
+
+        with self._condition:
+            self._blocks = []
+            self._frames = 0
+            self._condition.notify_all()
+
+    def put(self, micros: np.ndarray, samples: np.ndarray,
+            timeout: Optional[float] = None) -> bool:
+        """Add a block of frames (producer only).
+
+        :param micros: Timestamps of the block, shape (n,)
+        :param samples: Samples of the block, shape (channels, n)
+        :param timeout: Longest time to wait for room with the `'block'` policy
+            (forever when `None`)
+        :return: False if the block was not queued because the wait timed out
+        """
+
+        with self._condition:
+            if len(self._blocks) >= self.max_blocks:
+                if self.policy == 'block':
+                    if not self._condition.wait_for(
+                            lambda: len(self._blocks) < self.max_blocks, timeout):
+                        return False
+
+                elif self.policy == 'coalesce' and \
+                        self._blocks[-1][1].shape[0] == samples.shape[0] and \
+                        self._frames + len(micros) <= self.max_queued_frames:
+                    last = self._blocks[-1]
+                    last[0] = np.concatenate((last[0], micros))
+                    last[1] = np.hstack((last[1], samples))
+                    self._frames += len(micros)
+                    self.max_frames = max(self.max_frames, self._frames)
+                    self.coalesced_blocks += 1
+                    return True
+
+                else:  # Also when a block cannot be coalesced
+                    dropped = self._blocks.pop(0)
+                    self._frames -= len(dropped[0])
+                    self.dropped_frames += len(dropped[0])
+
+            was_empty = not self._blocks
+
+            self._blocks.append([micros, samples, time.perf_counter()])
+            self._frames += len(micros)
+            self.max_frames = max(self.max_frames, self._frames)
+
+            self._condition.notify_all()
+
+        if was_empty and self.on_ready is not None:
+            self.on_ready()
+
+        return True
+
+    def get(self, timeout: Optional[float] = 0.0) -> Optional[tuple]:
+        """Take the oldest block (consumer only).
+
+        :param timeout: Longest time to wait for a block (forever when `None`)
+        :return: Tuple of micros and samples, or `None` when the queue is empty
+        """
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._blocks, timeout):
+                return None
+
+            micros, samples, enqueued = self._blocks.pop(0)
+            self._frames -= len(micros)
+            self.worst_age = max(self.worst_age, time.perf_counter() - enqueued)
+
+            self._condition.notify_all()  # Room for a waiting producer
+
+        return micros, samples
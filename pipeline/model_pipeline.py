@@ -0,0 +1,143 @@
+import random
+import numpy as np
+
+from simulator.dynamics_model import DynamicsModel
+
+# Try to load user model, fallback on base model
+try:
+    from model.muscle_model import MuscleModel
+except ImportError:
+    from simulator.muscle_model_base import MuscleModelBase as MuscleModel
+try:
+    from model.muscle_model import EmgFilter
+except ImportError:
+    from simulator.muscle_model_base import EmgFilterBase as EmgFilter
+
+
+class ModelPipeline:
+    """Full processing chain from raw EMG to the simulated hand.
+
+    Each sample runs through `EmgFilter`, `MuscleModel` and `DynamicsModel`, after
+    which the target logic of the game is updated. This class does not depend on
+    Qt, so it is used both by the GUI and for offline replays.
+
+    For each sample the same six output channels are produced as shown in the
+    GUI, see `CHANNELS`.
+    """
+
+    CHANNELS = ['EMG1', 'EMG2', 'Torque', 'Angle', 'Target', 'Velocity']
+
+    TARGET_STEP = 30.0  # [deg]
+    TARGET_TIMEOUT = 10.0  # [s], pick a new target after this time regardless
+
+    def __init__(self, seed: int = None, integrator: str = 'semi_implicit',
+                 dynamics_step: int = 1):
+        """
+
+        :param seed: Seed for the random target generation (random when `None`)
+        :param integrator: Integrator of the dynamics model, see
+            `DynamicsModel.INTEGRATORS`
+        :param dynamics_step: Update the muscle and dynamics models only every this
+            many samples, with a correspondingly larger step (values are held in
+            between)
+        """
+
+        self.filter_model = EmgFilter()
+        self.muscle_model = MuscleModel()
+        dt = 1.0 / self.muscle_model.FS
+        self.dynamics_model = DynamicsModel(dt, integrator)
+
+        self.dynamics_step = dynamics_step
+        self._countdown = 0  # Samples until the next update of the models
+        self._state = (0.0, 0.0, 0.0)  # Last torque, angle and velocity
+
+        self.random = random.Random(seed)
+
+        self.target = 0.0
+        self.target_time = None  # Time at which the current target was set
+
+    def process(self, t: float, emg1: float, emg2: float) -> list:
+        """Run a single raw sample through the models.
+
+        :param t: Time of the sample [s]
+        :param emg1: Unfiltered EMG (channel 0)
+        :param emg2: Unfiltered EMG (channel 1)
+        :return: Values of the output channels
+        """
+
+        emg1, emg2 = self.filter_model.update(emg1, emg2)
+
+        return self._update_models(t, emg1, emg2)
+
+    def process_block(self, time: np.ndarray, emg1: np.ndarray, emg2: np.ndarray,
+                      filtered: bool = False) -> np.ndarray:
+        """Run a block of consecutive raw samples through the models.
+
+        The filtering is done for the whole block at once. The muscle and dynamics
+        models form a feedback loop, so those are still updated sample by sample.
+
+        :param time: Time of each sample [s]
+        :param emg1: Unfiltered EMG (channel 0)
+        :param emg2: Unfiltered EMG (channel 1)
+        :param filtered: The EMG was already filtered, skip the filter
+        :return: Output channels, shape (6, n)
+        """
+
+        if not filtered:
+            emg1, emg2 = self.filter_model.update_batch(emg1, emg2)
+
+        data = np.zeros((len(self.CHANNELS), len(time)))
+        for i, (t, e1, e2) in enumerate(zip(time.tolist(), emg1.tolist(), emg2.tolist())):
+            data[:, i] = self._update_models(t, e1, e2)
+
+        return data
+
+    def _update_models(self, t: float, emg1: float, emg2: float) -> list:
+        """Update muscle, dynamics and target with filtered EMG."""
+
+        if self._countdown == 0:
+            old_angle = self.dynamics_model.angle
+            torque = self.muscle_model.update(old_angle, emg1, emg2)
+            if self.dynamics_step == 1:
+                angle = self.dynamics_model.update(torque)
+            else:
+                angle = self.dynamics_model.update(
+                    torque, self.dynamics_step / self.muscle_model.FS)
+            self._state = (torque, angle, self.dynamics_model.velocity)
+            self._countdown = self.dynamics_step
+
+        self._countdown -= 1
+        torque, angle, velocity = self._state
+
+        self.update_target(t, angle, velocity)
+
+        return [emg1, emg2, torque, angle, self.target, velocity]
+
+    def update_target(self, t: float, angle: float, velocity: float):
+        """Move the target once it was reached or after a timeout.
+
+        :param t: Current time [s]
+        :param angle: Current angle of the hand
+        :param velocity: Current velocity of the hand
+        """
+
+        if self.target_time is None:
+            self.target_time = t
+
+        target = self.target
+
+        if abs(target - angle) < 5 and abs(velocity) < 10 \
+                or t - self.target_time > self.TARGET_TIMEOUT:
+
+            step = self.TARGET_STEP
+            if target <= -60:
+                target += step
+            elif target >= 60:
+                target -= step
+            elif self.random.random() > 0.5:
+                target += step
+            else:
+                target -= step
+
+            self.target = target
+            self.target_time = t
@@ -0,0 +1,61 @@
+"""Version of the models, as a hash of the source files that define their output.
+
+Recordings store (part of) this hash, and `pipeline.batch` uses it to tell when
+cached results are outdated. This module is kept small, so the GUI and the
+headless runner can use it without importing the batch machinery.
+"""
+
+import hashlib
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Of the repository
+
+# Source files that define the model output, relative to the root of the repository.
+# A change in any of them invalidates the cache.
+MODEL_SOURCES = [
+    'simulator/muscle_model_base.py',
+    'simulator/dynamics_model.py',
+    'simulator/digital_filter.py',
+    'simulator/muscle_set.py',
+    'simulator/lookup_table.py',
+    'pipeline/model_pipeline.py',
+    'pipeline/replay.py',
+    'pipeline/csv_loader.py',
+    'pipeline/recording_file.py',
+    'pipeline/resampler.py',
+]
+
+# The user model, the base model is used instead when it does not exist
+USER_MODEL_SOURCE = 'model/muscle_model.py'
+
+
+def file_hash(filename: str, hasher=None):
+    """Feed the content of a file into a hash (a new sha256 by default)."""
+
+    if hasher is None:
+        hasher = hashlib.sha256()
+
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            hasher.update(chunk)
+
+    return hasher
+
+
+def model_hash() -> str:
+    """Hash of all the model source files.
+
+    :raises FileNotFoundError: When one of `MODEL_SOURCES` is missing
+    """
+
+    hasher = hashlib.sha256()
+    for filename in MODEL_SOURCES:
+        hasher.update(filename.encode())
+        file_hash(os.path.join(ROOT, filename), hasher)
+
+    user_model = os.path.join(ROOT, USER_MODEL_SOURCE)
+    if os.path.isfile(user_model):
+        hasher.update(USER_MODEL_SOURCE.encode())
+        file_hash(user_model, hasher)
+
+    return hasher.hexdigest()
@@ -0,0 +1,142 @@
+import io
+import os
+import queue
+import threading
+import time
+import numpy as np
+from typing import Optional, Sequence
+
+from pipeline.recording_file import RecordingWriter, is_recording_file
+
+
+class Recorder:
+    """Stream output frames to disk from a background thread.
+
+    Frames are handed over with `write()`, which never touches the disk. A
+    background thread collects them into chunks and appends each chunk in a single
+    write, followed by a flush to the disk. After a crash the file is therefore
+    complete up to the last flushed chunk, and memory use does not grow with the
+    length of the session.
+
+    Files with the extension of the binary recording format (see `recording_file`)
+    are written in that format, other files get the same `;` separated CSV layout as
+    `save_recording()`. Both can be loaded with `load_recording()`.
+    """
+
+    CHUNK_FRAMES = 4096  # Write as soon as this many frames are waiting
+    FLUSH_TIME = 1.0  # [s], longest time frames wait before they are written
+
+    def __init__(self, filename: str, channels: Sequence[str], sample_rate: float = 0.0,
+                 model_version: str = ''):
+        """
+
+        :param filename: Destination file, it is overwritten
+        :param channels: Names of the channels (without the time)
+        :param sample_rate: Nominal sample rate [Hz], stored in binary recordings
+        :param model_version: Identification of the model, stored in binary recordings
+        """
+
+        self.filename = filename
+        self.channels = list(channels)
+        self.sample_rate = sample_rate
+        self.model_version = model_version
+
+        self.frames_written = 0  # Frames that are safely on disk
+        self.error: Optional[Exception] = None  # Error of the writer thread, if any
+
+        self._blocks = queue.Queue()  # Blocks of (1 + channels, n), `None` to stop
+        self._thread = None
+        self._file = None  # CSV file
+        self._writer: Optional[RecordingWriter] = None  # Binary recording
+
+    def start(self):
+        """Create the file and start the writer thread."""
+
+        if is_recording_file(self.filename):
+            self._writer = RecordingWriter(self.filename, self.channels, self.sample_rate,
+                                           self.model_version)
+            self._writer.flush()
+        else:
+            self._file = open(self.filename, 'w')
+            header = 'time [s]'
+            for i in range(len(self.channels)):
+                header += ', Channel {}'.format(i)
+            self._file.write('# ' + header + '\n')
+            self._file.flush()
+
+        self._thread = threading.Thread(target=self.run, name='Recorder', daemon=True)
+        self._thread.start()
+
+    def write(self, columns: np.ndarray):
+        """Queue frames for writing (does not block).
+
+        :param columns: Time and channels, shape (1 + channels, n)
+        """
+
+        if self._thread is not None:
+            self._blocks.put(np.array(columns))  # Copy, the caller may reuse its buffer
+
+    def stop(self):
+        """Write all remaining frames and close the file."""
+
+        if self._thread is None:
+            return
+
+        self._blocks.put(None)
+        self._thread.join()
+        self._thread = None
+
+        if self._writer is not None:
+            self._writer.close()  # Adds the time index
+            self._writer = None
+        else:
+            self._file.close()
+            self._file = None
+
+    def run(self):
+        """Loop of the writer thread."""
+
+        chunk = []
+        frames = 0
+        deadline = time.perf_counter() + self.FLUSH_TIME
+        running = True
+
+        while running:
+            try:
+                block = self._blocks.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                block = ()  # Timed out, flush what is there
+
+            if block is None:
+                running = False
+            elif len(block):
+                chunk.append(block)
+                frames += block.shape[1]
+
+            if not running or frames >= self.CHUNK_FRAMES or \
+                    time.perf_counter() >= deadline:
+                if chunk and self.error is None:
+                    try:
+                        self.write_chunk(np.hstack(chunk))
+                        self.frames_written += frames
+                    except OSError as err:
+                        self.error = err  # Keep draining, so the producer is not held up
+
+                chunk = []
+                frames = 0
+                deadline = time.perf_counter() + self.FLUSH_TIME
+
+    def write_chunk(self, columns: np.ndarray):
+        """Append a chunk to the file and flush it to disk."""
+
+        if self._writer is not None:
+            self._writer.write(columns)
+            self._writer.flush()
+            return
+
+        text = io.StringIO()  # Format first, so the chunk is appended in one go
+        np.savetxt(text, columns.transpose(), delimiter=';', fmt='%f')
+
+        self._file.write(text.getvalue())
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,201 @@
+"""Binary recording format that can be read without parsing.
+
+A recording file consists of:
+
+ * A header of `HEADER_SIZE` bytes: the `MAGIC` line followed by JSON with the
+   channel names, the sample rate, the model version and, once the file is
+   closed, the number of frames and the location of the time index
+ * The frames, each frame is the time followed by all channels, as little-endian
+   64-bit floats
+ * A sparse time index: the time of every `INDEX_STEP`-th frame
+
+Because the frames have a fixed size, a reader maps the file into memory and only
+the pages of the requested time range are loaded from disk. A file that was not
+closed (e.g. after a crash) has no index and no frame count in its header. It can
+still be read: the number of frames follows from the file size, and time ranges
+are found by a binary search over the time column.
+"""
+
+import json
+import os
+import numpy as np
+from typing import Optional, Sequence
+
+MAGIC = b'uScope recording\n'
+EXTENSION = '.bin'
+HEADER_SIZE = 4096
+INDEX_STEP = 1024  # Frames per entry of the time index
+VERSION = 1
+
+DTYPE = np.dtype('<f8')
+
+
+def is_recording_file(filename: str) -> bool:
+    """Check if a file is a binary recording (by its extension)."""
+    return filename.lower().endswith(EXTENSION)
+
+
+class RecordingWriter:
+    """Append frames to a binary recording file."""
+
+    def __init__(self, filename: str, channels: Sequence[str], sample_rate: float,
+                 model_version: str = ''):
+        """Create the file, an existing file is overwritten.
+
+        :param filename: Destination file
+        :param channels: Names of the channels (without the time)
+        :param sample_rate: Nominal sample rate [Hz]
+        :param model_version: Identification of the model that produced the data
+        """
+
+        self.header = {
+            'version': VERSION,
+            'channels': list(channels),
+            'sample_rate': sample_rate,
+            'model_version': model_version,
+            'frames': None,  # Known once closed
+            'index_offset': None,
+            'index_step': INDEX_STEP,
+        }
+
+        self.frames = 0
+        self._index = []  # Time of every `INDEX_STEP`-th frame
+
+        self._file = open(filename, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        text = MAGIC + json.dumps(self.header).encode() + b'\n'
+        if len(text) > HEADER_SIZE:
+            raise ValueError('Header does not fit in {} bytes'.format(HEADER_SIZE))
+
+        self._file.seek(0)
+        self._file.write(text.ljust(HEADER_SIZE, b' '))
+
+    def write(self, columns: np.ndarray):
+        """Append frames.
+
+        :param columns: Time and channels, shape (1 + channels, n)
+        """
+
+        n = columns.shape[1]
+        if columns.shape[0] != 1 + len(self.header['channels']):
+            raise ValueError('Expected {} rows, got {}'.format(
+                1 + len(self.header['channels']), columns.shape[0]))
+
+        first = -(-self.frames // INDEX_STEP) * INDEX_STEP - self.frames  # Next entry
+        self._index.extend(columns[0, first:n:INDEX_STEP].tolist())
+
+        self._file.write(np.ascontiguousarray(columns.transpose(), dtype=DTYPE).tobytes())
+        self.frames += n
+
+    def flush(self):
+        """Make sure all written frames are on disk."""
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Write the time index and complete the header."""
+
+        if self._file is None:
+            return
+
+        self.header['frames'] = self.frames
+        self.header['index_offset'] = self._file.tell()
+        self._file.write(np.array(self._index, dtype=DTYPE).tobytes())
+
+        self._write_header()
+        self.flush()
+
+        self._file.close()
+        self._file = None
+
+
+class RecordingFile:
+    """Memory-mapped reader of a binary recording file."""
+
+    def __init__(self, filename: str):
+        """
+
+        :param filename: Recording to open
+        """
+
+        with open(filename, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+
+        if not header.startswith(MAGIC):
+            raise ValueError('`{}` is not a recording file'.format(filename))
+
+        self.header = json.loads(header[len(MAGIC):].decode().strip())
+        if self.header['version'] > VERSION:
+            raise ValueError('Recording version {} is not supported'.format(
+                self.header['version']))
+
+        self.channels = self.header['channels']
+        self.sample_rate = self.header['sample_rate']
+        self.model_version = self.header['model_version']
+
+        columns = 1 + len(self.channels)
+        frames = self.header['frames']
+        if frames is None:  # Not closed, use all complete frames
+            frames = (os.path.getsize(filename) - HEADER_SIZE) // (columns * DTYPE.itemsize)
+
+        self.frames: np.ndarray = np.zeros((0, columns))
+        if frames > 0:
+            self.frames = np.memmap(filename, dtype=DTYPE, mode='r', offset=HEADER_SIZE,
+                                    shape=(frames, columns))
+
+        self.index: Optional[np.ndarray] = None
+        if self.header['index_offset'] is not None:
+            self.index = np.fromfile(filename, dtype=DTYPE,
+                                     count=-(-frames // self.header['index_step']),
+                                     offset=self.header['index_offset'])
+
+    def __len__(self) -> int:
+        return self.frames.shape[0]
+
+    @property
+    def time(self) -> np.ndarray:
+        """Time of all frames, shape (n,) (not loaded until used)."""
+        return self.frames[:, 0]
+
+    @property
+    def data(self) -> np.ndarray:
+        """All channels, shape (channels, n) (not loaded until used)."""
+        return self.frames[:, 1:].transpose()
+
+    def find(self, t: float) -> int:
+        """Get the index of the first frame at or after a time.
+
+        :param t: Time [s]
+        :return: Frame index, `len(self)` when all frames are earlier
+        """
+
+        if self.index is None:
+            return int(np.searchsorted(self.time, t))
+
+        # Narrow down with the index, then search only between two entries
+        step = self.header['index_step']
+        k = int(np.searchsorted(self.index, t))
+        start = max(0, (k - 1) * step)
+        stop = min(len(self), k * step)
+
+        return start + int(np.searchsorted(self.time[start:stop], t))
+
+    def slice(self, t_start: float, t_stop: float) -> (np.ndarray, np.ndarray):
+        """Get the frames in a time range, without loading anything else.
+
+        :param t_start: Start of the range [s]
+        :param t_stop: End of the range (excluded) [s]
+        :return: Time of shape (n,) and channels of shape (channels, n), both
+            backed by the file
+        """
+
+        frames = self.frames[self.find(t_start):self.find(t_stop), :]
+
+        return frames[:, 0], frames[:, 1:].transpose()
+
+    def close(self):
+        """Drop the memory map, the file is closed once no views are left."""
+        self.frames = np.zeros((0, 1 + len(self.channels)))
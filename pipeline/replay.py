@@ -0,0 +1,154 @@
+"""Offline replay of recordings through the model pipeline.
+
+Run from the root of the repository, e.g.:
+
+    python -m pipeline.replay data/EMG_example.csv -o replay.csv
+
+The result holds the same six channels as the recordings made by the GUI.
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from typing import Tuple
+
+from pipeline.csv_loader import load_columns
+from pipeline.model_pipeline import ModelPipeline
+from pipeline.recording_file import RecordingFile, RecordingWriter, is_recording_file
+from simulator.dynamics_model import DynamicsModel
+
+
+def load_recording(filename: str, fs: float) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """Load the time and EMG of a recording.
+
+    Supported are:
+     * binary recordings (see `recording_file`)
+     * `.npz` files saved by the GUI
+     * `.csv` files saved by the GUI (`;` separated, with a `#` header)
+     * `.csv` files with only EMG columns and no header (e.g. `EMG_example.csv`)
+
+    Recordings made by the GUI (or by a replay) hold the output channels of
+    `ModelPipeline`, so their first two channels are EMG that was already filtered
+    and normalized. Any other recording is taken as raw EMG.
+
+    :param filename: Path to the recording
+    :param fs: Sample rate, used when the file contains no time column
+    :return: Time [s] of shape (n,), EMG of shape (2, n) and whether the EMG is
+        already filtered
+    """
+
+    if is_recording_file(filename):
+        recording = RecordingFile(filename)
+        time, data = np.array(recording.time), recording.data
+    elif filename.lower().endswith('.npz'):
+        with np.load(filename) as file:
+            time, data = file['time'][0, :].astype(float), file['data'].astype(float)
+    else:
+        with open(filename, 'r') as file:
+            has_header = file.readline().startswith('#')
+
+        columns = load_columns(filename)
+
+        if not has_header:
+            emg = np.array(columns[0:2, :])
+            return np.arange(emg.shape[1]) / fs, emg, False
+
+        time, data = np.array(columns[0, :]), columns[1:, :]
+
+    filtered = data.shape[0] == len(ModelPipeline.CHANNELS)
+
+    return time, np.array(data[:2, :]), filtered
+
+
+def save_recording(filename: str, time: np.ndarray, data: np.ndarray):
+    """Save output channels in the same format as the GUI.
+
+    :param filename: Destination, `.npz` for numpy, the binary recording extension
+        for a binary recording, otherwise CSV
+    :param time: Time [s] of shape (n,) or (1, n)
+    :param data: Channels, each row is a channel
+    """
+
+    time = np.reshape(time, (1, -1))
+
+    if is_recording_file(filename):
+        channels = ['Channel {}'.format(i) for i in range(data.shape[0])]
+        writer = RecordingWriter(filename, channels, 0.0)
+        writer.write(np.vstack((time, data)))
+        writer.close()
+    elif filename.lower().endswith('.npz'):
+        np.savez(filename, data=data, time=time)
+    else:
+        header = 'time [s]'
+        for i in range(data.shape[0]):
+            header += ', Channel {}'.format(i)
+
+        np.savetxt(filename, np.vstack((time, data)).transpose(), delimiter=';',
+                   header=header, fmt='%f')
+
+
+def replay(time: np.ndarray, emg: np.ndarray, pipeline: ModelPipeline = None,
+           block_size: int = 4096, filtered: bool = False) -> np.ndarray:
+    """Run a recording through the model pipeline as fast as possible.
+
+    :param time: Time [s] of each sample, shape (n,)
+    :param emg: EMG, shape (2, n)
+    :param pipeline: Pipeline to use (a fresh one is created when `None`)
+    :param block_size: Number of samples that are filtered at once
+    :param filtered: The EMG was already filtered (e.g. a recording made by the
+        GUI), skip the filter
+    :return: Output channels, shape (6, n)
+    """
+
+    if pipeline is None:
+        pipeline = ModelPipeline()
+
+    data = np.zeros((len(pipeline.CHANNELS), len(time)))
+
+    for start in range(0, len(time), block_size):
+        end = start + block_size
+        data[:, start:end] = pipeline.process_block(time[start:end], emg[0, start:end],
+                                                    emg[1, start:end], filtered)
+
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recording through the '
+                                                 'EMG filter, muscle and dynamics '
+                                                 'models, without a board attached.')
+    parser.add_argument('input', help='Recording to replay (.csv, .npz or .bin)')
+    parser.add_argument('-o', '--output', help='Output file (.csv, .npz or .bin), by default '
+                                               '`<input>_replay.csv`')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the target generation')
+    parser.add_argument('--integrator', choices=DynamicsModel.INTEGRATORS,
+                        default='semi_implicit', help='Integrator of the dynamics model')
+    parser.add_argument('--dynamics-step', type=int, default=1,
+                        help='Update the muscle and dynamics models every this many '
+                             'samples')
+    args = parser.parse_args()
+
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.input)[0] + '_replay.csv'
+
+    pipeline = ModelPipeline(seed=args.seed, integrator=args.integrator,
+                             dynamics_step=args.dynamics_step)
+
+    time_data, emg, filtered = load_recording(args.input, pipeline.muscle_model.FS)
+
+    start = time.perf_counter()
+    data = replay(time_data, emg, pipeline, filtered=filtered)
+    duration = time.perf_counter() - start
+
+    save_recording(output, time_data, data)
+
+    recorded = len(time_data) / pipeline.muscle_model.FS
+    print('Replayed {} samples ({:.1f} s of data) in {:.2f} s, saved to {}'.format(
+        len(time_data), recorded, duration, output))
+
+
+if __name__ == '__main__':
+    main()
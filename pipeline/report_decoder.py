@@ -0,0 +1,96 @@
+import ctypes
+import struct
+import numpy as np
+
+
+class ReportDecoder:
+    """Decoder for the HID reports sent by the firmware.
+
+    Each report starts with the number of channels (a single byte), followed by the
+    `micros` timestamp (a `c_long`) and a `c_float` per channel.
+
+    The layouts are compiled once per channel count, as a `struct.Struct` for single
+    reports and as a numpy structured dtype to decode many reports at once with
+    `np.frombuffer`.
+    """
+
+    HEADER_SIZE = 1  # Channel count byte
+    MICROS_SIZE = ctypes.sizeof(ctypes.c_long)
+    FLOAT_SIZE = ctypes.sizeof(ctypes.c_float)
+
+    def __init__(self, report_size: int = 64):
+        """
+
+        :param report_size: Size of a full report in bytes
+        """
+
+        self.report_size = report_size
+
+        self._structs = {}  # Cached layouts per channel count
+        self._dtypes = {}
+
+    def max_channels(self) -> int:
+        """Largest number of channels that fits in a report."""
+        return (self.report_size - self.HEADER_SIZE - self.MICROS_SIZE) // self.FLOAT_SIZE
+
+    def frame_struct(self, channels: int) -> struct.Struct:
+        """Get the compiled layout of a single report (without the channel byte)."""
+
+        if channels not in self._structs:
+            self._structs[channels] = struct.Struct('L' + (channels * 'f'))
+
+        return self._structs[channels]
+
+    def report_dtype(self, channels: int) -> np.dtype:
+        """Get the structured dtype of a full report, including padding."""
+
+        if channels not in self._dtypes:
+            if channels > self.max_channels():
+                raise ValueError('{} channels do not fit in a report of {} bytes'.format(
+                    channels, self.report_size))
+
+            self._dtypes[channels] = np.dtype({
+                'names': ['channels', 'micros', 'samples'],
+                'formats': [np.uint8, np.dtype('u{}'.format(self.MICROS_SIZE)),
+                            (np.float32, (channels,))],
+                'offsets': [0, self.HEADER_SIZE, self.HEADER_SIZE + self.MICROS_SIZE],
+                'itemsize': self.report_size,
+            })
+
+        return self._dtypes[channels]
+
+    def decode(self, report) -> (int, tuple):
+        """Decode a single report.
+
+        :param report: Raw report (list of ints or bytes-like)
+        :return: Timestamp in micros and a tuple of channel values
+        """
+
+        channels = report[0]
+        frame = self.frame_struct(channels).unpack_from(bytes(report), self.HEADER_SIZE)
+
+        return frame[0], frame[1:]
+
+    def decode_block(self, buffer, count: int) -> (np.ndarray, np.ndarray):
+        """Decode many consecutive reports at once, without copying them first.
+
+        All reports must have the same number of channels.
+
+        :param buffer: Bytes-like object holding at least `count` full reports
+        :param count: Number of reports to decode
+        :return: Timestamps in micros of shape (n,) and samples of shape (channels, n)
+        """
+
+        if count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 0))
+
+        channels = buffer[0]
+        reports = np.frombuffer(buffer, dtype=self.report_dtype(channels), count=count)
+
+        if np.any(reports['channels'] != channels):
+            raise ValueError('Reports in a block must have the same number of channels')
+
+        micros = reports['micros'].astype(np.int64)
+        samples = reports['samples'].astype(float).transpose()
+
+        return micros, samples
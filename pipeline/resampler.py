@@ -0,0 +1,206 @@
+import numpy as np
+
+
+class Resampler:
+    """Resample timestamped frames onto an exact, uniform grid.
+
+    The filters and the dynamics model assume a fixed sample rate, but reports from
+    the board arrive with jitter, and reports can be lost. Based on the `micros`
+    timestamp of each frame, the blocks are linearly interpolated onto a grid of
+    exactly `rate`. Short gaps are bridged by interpolation. After a gap longer
+    than `max_gap` the grid starts again at the next frame instead of inventing a
+    long stretch of data.
+
+    The `micros` counter of the board wraps around, this is undone first. Frames
+    that do not move forward in time are dropped.
+
+    Blocks are processed with vectorized operations. The last frame of a block is
+    kept to interpolate up to the first frame of the next block.
+
+    The gaps and jitter are measured against `source_rate`, the rate at which the
+    source sends its frames. For load tests the grid can be skipped altogether
+    with `resample=False`, the frames are then passed on at the rate of the source.
+    """
+
+    WRAP = 1 << 32  # The micros counter of the board is an unsigned 32-bit integer
+
+    def __init__(self, rate: float = 750.0, max_gap: float = 0.1,
+                 source_rate: float = None, resample: bool = True):
+        """
+
+        :param rate: Rate of the output grid [Hz]
+        :param max_gap: Longest gap that is interpolated [s]
+        :param source_rate: Rate at which the source sends frames (`rate` when
+            `None`) [Hz]
+        :param resample: When false, pass the frames on with their own times
+        """
+
+        self.rate = rate
+        self.max_gap = max_gap
+        self.source_rate = rate if source_rate is None else source_rate
+        self.resample = resample
+
+        self._origin = None  # Unwrapped micros of the first frame
+        self._wraps = 0  # Number of times the micros counter wrapped
+        self._last_micros = 0
+        self._last_time = None  # Time and values of the last frame so far
+        self._last_values = None
+        self._grid_start = 0.0  # Time of the grid point with index 0
+        self._grid_index = 0  # Index of the next grid point
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the counters."""
+
+        self.frames_in = 0
+        self.frames_out = 0
+        self.dropped_frames = 0  # Frames that went back in time
+        self.gaps = 0  # Intervals of more than 1.5 periods
+        self.missing_frames = 0  # Estimated number of frames lost in those gaps
+        self.max_gap_time = 0.0  # [s], longest interval
+        self.resyncs = 0  # Gaps longer than `max_gap`
+        self._jitter_sum = 0.0  # Sum of squared deviations of normal intervals
+        self._jitter_count = 0
+
+    def stats(self) -> dict:
+        """Get the counters, including the RMS jitter of the normal intervals [s]."""
+
+        jitter = 0.0
+        if self._jitter_count > 0:
+            jitter = float(np.sqrt(self._jitter_sum / self._jitter_count))
+
+        return {
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'dropped_frames': self.dropped_frames,
+            'gaps': self.gaps,
+            'missing_frames': self.missing_frames,
+            'max_gap': self.max_gap_time,
+            'resyncs': self.resyncs,
+            'jitter': jitter,
+        }
+
+    def unwrap(self, micros: np.ndarray) -> np.ndarray:
+        """Undo the wrapping of the micros counter.
+
+        :param micros: Raw timestamps of consecutive frames
+        :return: Continuous timestamps (int64)
+        """
+
+        micros = np.asarray(micros, dtype=np.int64) % self.WRAP
+        previous = np.concatenate(([self._last_micros], micros[:-1]))
+
+        # A big step back is a wrap, a small one is just a frame out of order
+        wrapped = previous - micros > self.WRAP // 2
+        wraps = self._wraps + np.cumsum(wrapped)
+
+        if micros.size > 0:
+            self._last_micros = int(micros[-1])
+            self._wraps = int(wraps[-1])
+
+        return micros + wraps * self.WRAP
+
+    def process(self, micros: np.ndarray, samples: np.ndarray) -> (np.ndarray, np.ndarray):
+        """Resample a block of frames.
+
+        :param micros: Timestamps of the block, shape (n,)
+        :param samples: Samples of the block, shape (channels, n)
+        :return: Time [s] since the first frame, shape (m,), and resampled
+            samples, shape (channels, m)
+        """
+
+        channels = samples.shape[0]
+        self.frames_in += len(micros)
+
+        if len(micros) == 0:
+            return np.zeros(0), np.zeros((channels, 0))
+
+        micros = self.unwrap(micros)
+        if self._origin is None:
+            self._origin = int(micros[0])
+
+        time = 1.0e-6 * (micros - self._origin)
+        values = np.asarray(samples, dtype=float)
+
+        continued = self._last_time is not None
+        if not continued:
+            self._grid_start = time[0]
+            self._grid_index = 0
+        else:  # Continue from the last frame of the previous block
+            time = np.concatenate(([self._last_time], time))
+            values = np.hstack((self._last_values[:, np.newaxis], values))
+
+        # Drop frames that do not move forward in time
+        keep = np.ones(time.size, dtype=bool)
+        keep[1:] = time[1:] > np.maximum.accumulate(time)[:-1]
+        self.dropped_frames += int(np.count_nonzero(~keep))
+        time = time[keep]
+        values = values[:, keep]
+
+        self._last_time = time[-1]
+        self._last_values = values[:, -1].copy()
+
+        intervals = np.diff(time)
+        self.update_stats(intervals)
+
+        if not self.resample:
+            first = 1 if continued else 0  # The last frame of the last block was sent
+            self.frames_out += time.size - first
+            return time[first:], values[:, first:]
+
+        # Split at the gaps that are too long to interpolate
+        breaks = np.flatnonzero(intervals > self.max_gap) + 1
+        self.resyncs += len(breaks)
+
+        out_time = []
+        out_values = []
+        for segment, start in enumerate(np.concatenate(([0], breaks))):
+            stop = breaks[segment] if segment < len(breaks) else time.size
+            if segment > 0:  # Start a new grid
+                self._grid_start = time[start]
+                self._grid_index = 0
+
+            segment_time = time[start:stop]
+            segment_values = values[:, start:stop]
+
+            # Grid points up to the last frame of the segment
+            count = int(np.floor((segment_time[-1] - self._grid_start) * self.rate + 1.0e-9))
+            count -= self._grid_index - 1
+            if count <= 0:
+                continue
+
+            grid = self._grid_start + \
+                np.arange(self._grid_index, self._grid_index + count) / self.rate
+            self._grid_index += count
+
+            out_time.append(grid)
+            out_values.append(np.vstack([np.interp(grid, segment_time, segment_values[i, :])
+                                         for i in range(channels)]))
+
+        if not out_time:
+            return np.zeros(0), np.zeros((channels, 0))
+
+        out_time = np.concatenate(out_time)
+        out_values = np.hstack(out_values)
+        self.frames_out += out_time.size
+
+        return out_time, out_values
+
+    def update_stats(self, intervals: np.ndarray):
+        """Count the gaps and the jitter of the intervals between frames."""
+
+        if intervals.size == 0:
+            return
+
+        period = 1.0 / self.source_rate
+        self.max_gap_time = max(self.max_gap_time, float(np.max(intervals)))
+
+        gaps = intervals > 1.5 * period
+        self.gaps += int(np.count_nonzero(gaps))
+        self.missing_frames += int(np.sum(np.round(intervals[gaps] * self.source_rate)
+                                          - 1))
+
+        deviation = intervals[~gaps] - period
+        self._jitter_sum += float(np.sum(deviation ** 2))
+        self._jitter_count += deviation.size
@@ -0,0 +1,178 @@
+from multiprocessing import shared_memory
+import numpy as np
+from typing import Optional
+
+
+class SampleRing:
+    """Lock-free ring buffer of multi-channel samples for one writer and one reader.
+
+    The samples are stored in a preallocated numpy array and every sample is
+    written twice, once in each half of the array. Any window of up to `capacity`
+    recent samples is therefore contiguous in memory and can be handed out as a view
+    instead of a copy.
+
+    The head (number of samples written) and tail (number of samples consumed) are
+    single 64-bit integers. Only the writer moves the head, and it does so only
+    after the samples are stored, so the reader never needs a lock. A view stays
+    valid until the writer has written `capacity - n` more samples. Choose the
+    capacity with some margin over the largest window that is read.
+
+    Optionally the ring lives in named shared memory, so it can also be shared
+    between processes.
+    """
+
+    INDEX_BYTES = 2 * np.dtype(np.int64).itemsize
+
+    def __init__(self, rows: int, capacity: int, name: Optional[str] = None,
+                 create: bool = True):
+        """
+
+        :param rows: Number of values per sample (e.g. time plus channels)
+        :param capacity: Number of samples that are kept
+        :param name: Name of a shared memory block to use (process memory when `None`)
+        :param create: Create the shared memory block, otherwise attach to an
+            existing one (ignored without `name`)
+        """
+
+        self.rows = rows
+        self.capacity = capacity
+
+        size = self.INDEX_BYTES + rows * 2 * capacity * np.dtype(float).itemsize
+
+        self._shared = None
+        if name is None:
+            memory = bytearray(size)
+        else:
+            self._shared = shared_memory.SharedMemory(name=name, create=create, size=size)
+            memory = self._shared.buf
+        self._owner = create
+
+        # [head, tail]
+        self._indices = np.ndarray((2,), dtype=np.int64, buffer=memory)
+        self.buffer = np.ndarray((rows, 2 * capacity), dtype=float, buffer=memory,
+                                 offset=self.INDEX_BYTES)
+
+        if name is None or create:
+            self._indices[:] = 0
+
+    @property
+    def name(self) -> Optional[str]:
+        """Name of the shared memory block, `None` for process memory."""
+        return None if self._shared is None else self._shared.name
+
+    @property
+    def head(self) -> int:
+        """Total number of samples written."""
+        return int(self._indices[0])
+
+    @property
+    def tail(self) -> int:
+        """Total number of samples consumed by `read()`."""
+        return int(self._indices[1])
+
+    def __len__(self) -> int:
+        return min(self.head, self.capacity)
+
+    def close(self):
+        """Release the shared memory block (if any)."""
+
+        if self._shared is not None:
+            self._indices = None  # Views must be gone before the memory is closed
+            self.buffer = None
+            self._shared.close()
+            if self._owner:
+                self._shared.unlink()
+            self._shared = None
+
+    def append(self, column):
+        """Add a single sample (writer only).
+
+        :param column: Values of the sample, one per row
+        """
+
+        head = self.head
+        index = head % self.capacity
+        self.buffer[:, index] = column
+        self.buffer[:, index + self.capacity] = column
+
+        self._indices[0] = head + 1  # Publish only after the data is stored
+
+    def write(self, columns: np.ndarray):
+        """Add multiple samples at once (writer only).
+
+        :param columns: Samples of shape (rows, n), oldest first
+        """
+
+        head = self.head
+        n = columns.shape[1]
+        if n > self.capacity:  # Only the last part remains anyway
+            head += n - self.capacity
+            columns = columns[:, -self.capacity:]
+            n = self.capacity
+
+        index = head % self.capacity
+        first = min(n, self.capacity - index)
+
+        for start, part in ((index, columns[:, :first]), (0, columns[:, first:])):
+            k = part.shape[1]
+            self.buffer[:, start:(start + k)] = part
+            self.buffer[:, (start + self.capacity):(start + self.capacity + k)] = part
+
+        self._indices[0] = head + n  # Publish only after the data is stored
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        """Get a view of the most recent samples, without copying.
+
+        :param n: Number of samples (all samples when `None`)
+        :return: View of shape (rows, n), oldest first
+        """
+
+        head = self.head
+        available = min(head, self.capacity)
+        if n is None or n > available:
+            n = available
+
+        start = (head - n) % self.capacity
+
+        return self.buffer[:, start:(start + n)]
+
+    def view(self, start: int, stop: int) -> np.ndarray:
+        """Get a view of samples by their absolute index (counted from the first write).
+
+        :param start: Index of the first sample
+        :param stop: Index after the last sample
+        :return: View of shape (rows, stop - start), oldest first
+        """
+
+        head = self.head
+        if start < head - self.capacity or stop > head or start > stop:
+            raise IndexError('Samples {}-{} are not in the ring'.format(start, stop))
+
+        index = start % self.capacity
+
+        return self.buffer[:, index:(index + stop - start)]
+
+    def read(self, max_samples: Optional[int] = None) -> (np.ndarray, int):
+        """Consume the samples that were written since the previous read (reader only).
+
+        :param max_samples: Largest number of samples to return (all when `None`)
+        :return: View of the new samples of shape (rows, n), and the number of
+            samples that were overwritten before they could be read
+        """
+
+        head = self.head
+        tail = self.tail
+
+        lost = max(0, head - tail - self.capacity)
+        tail += lost
+
+        n = head - tail
+        if max_samples is not None:
+            n = min(n, max_samples)
+
+        start = tail % self.capacity
+        view = self.buffer[:, start:(start + n)]
+
+        self._indices[1] = tail + n
+
+        return view, lost
@@ -0,0 +1,195 @@
+import time
+import numpy as np
+from typing import Callable, Optional
+
+from pipeline.frame_queue import FrameQueue
+from pipeline.model_pipeline import ModelPipeline
+from pipeline.recorder import Recorder
+from pipeline.resampler import Resampler
+from pipeline.sample_ring import SampleRing
+from pipeline.tiered_history import TieredHistory
+
+
+class Session:
+    """Processing side of a live session, without any dependency on Qt.
+
+    Blocks of raw frames from the queue (e.g. filled by an `Acquisition` loop) are
+    resampled onto an exact grid based on their timestamps, and then passed through
+    the filter, muscle and dynamics models. The output is stored in a lock-free
+    tiered history: the most recent frames at full rate and the rest of the session
+    at coarser resolutions. Readers in other threads take views of that history, so
+    a slow reader never stalls the models. Optionally all output is streamed to a
+    `Recorder`.
+
+    The state of the hand is published through `on_state` at display rate only.
+
+    For load tests with a fast source, `resample=False` runs the models on every
+    frame at the rate of the source instead. The filters are designed for the
+    rate of the models, so the output is then not meaningful.
+    """
+
+    FRAME_TIME = 1.0 / 60.0  # Minimum time between published states
+
+    # Extra history capacity, so views handed to readers stay valid while new
+    # frames come in
+    HISTORY_MARGIN = 1500
+
+    def __init__(self, queue: FrameQueue, history_size: int = 200,
+                 pipeline: Optional[ModelPipeline] = None,
+                 on_state: Optional[Callable[[float, float], None]] = None,
+                 on_channels_error: Optional[Callable[[int], None]] = None,
+                 source_rate: Optional[float] = None, resample: bool = True):
+        """
+
+        :param queue: Queue with blocks of raw frames
+        :param history_size: Number of output frames to keep at full rate
+        :param pipeline: Models to run (a default pipeline when `None`)
+        :param on_state: Called with the angle and target of the hand
+        :param on_channels_error: Called with the number of channels of a block that
+            does not have the expected two channels
+        :param source_rate: Rate at which the source sends frames, to measure gaps
+            and jitter (the rate of the models when `None`) [Hz]
+        :param resample: When false, skip the resampling onto the rate of the models
+        """
+
+        self.queue = queue
+
+        if pipeline is None:
+            pipeline = ModelPipeline()
+        self.pipeline = pipeline
+
+        self.on_state = on_state
+        self.on_channels_error = on_channels_error
+
+        if source_rate is None:
+            source_rate = pipeline.muscle_model.FS
+        self.source_rate = source_rate
+        self.resample = resample
+
+        self.history_size = history_size
+        self.history = self.create_history(history_size)
+        self.resampler = self.create_resampler()
+
+        self.last_publish = 0.0  # System time of the last published state
+
+        self.recorder: Optional[Recorder] = None  # Streams all output frames to disk
+
+        self._is_running = True
+
+    def reset(self, history_size: int):
+        """Start a new recording, with a new history size.
+
+        :param history_size: Number of output frames to keep at full rate
+        """
+
+        # Replacing the reference is atomic, readers keep reading the old
+        # history until they pick up the new one
+        self.history = self.create_history(history_size)
+        self.history_size = history_size
+        self.resampler = self.create_resampler()  # Time starts again at 0
+        self.pipeline.target_time = None  # Otherwise the target waits for the old time
+        self.last_publish = 0.0
+
+    def set_recorder(self, recorder: Optional[Recorder]):
+        """Start streaming output frames to a recorder, or stop with `None`.
+
+        The previous recorder is stopped.
+
+        :param recorder: Recorder that was started already
+        """
+
+        if self.recorder is not None:
+            self.recorder.stop()
+
+        self.recorder = recorder
+
+    def create_resampler(self) -> Resampler:
+        """Create a resampler for the rate of the models and of the source."""
+        return Resampler(self.pipeline.muscle_model.FS, source_rate=self.source_rate,
+                         resample=self.resample)
+
+    @property
+    def frame_rate(self) -> float:
+        """Rate of the output frames [Hz]."""
+        return self.pipeline.muscle_model.FS if self.resample else self.source_rate
+
+    def create_history(self, history_size: int) -> TieredHistory:
+        """Allocate a new history, time plus output channels."""
+
+        recent = SampleRing(1 + len(self.pipeline.CHANNELS),
+                            history_size + self.HISTORY_MARGIN)
+
+        return TieredHistory(recent, history_size, self.frame_rate)
+
+    def latest(self, n: int = None) -> np.ndarray:
+        """Get a view of the most recent history (safe to call from any thread).
+
+        Don't modify the view, and copy it if it is kept for long.
+
+        :param n: Number of frames (the full history size when `None`)
+        :return: Time and output channels, shape (1 + channels, n)
+        """
+
+        history_size = self.history_size
+        if n is None or n > history_size:
+            n = history_size
+
+        return self.history.recent.latest(n)
+
+    def run(self, timeout: float = 0.05):
+        """Process blocks as they come in, until `stop()` is called.
+
+        :param timeout: Longest time to wait for a block before checking the stop
+            flag again [s]
+        """
+
+        self._is_running = True
+
+        while self._is_running:
+            block = self.queue.get(timeout)
+            if block is not None:
+                self.process(*block)
+                self.process_queue()
+
+    def stop(self):
+        """Stop the loop of `run()`."""
+        self._is_running = False
+
+    def process_queue(self):
+        """Process all blocks that are waiting in the queue."""
+
+        block = self.queue.get()
+        while block is not None:
+            self.process(*block)
+            block = self.queue.get()
+
+    def process(self, micros: np.ndarray, samples: np.ndarray):
+        """Run a new block of raw frames through the models.
+
+        :param micros: Timestamps of the block, shape (n,)
+        :param samples: Raw samples of the block, shape (channels, n)
+        """
+
+        if samples.shape[0] != 2:
+            if self.on_channels_error is not None:
+                self.on_channels_error(samples.shape[0])
+            return
+
+        t, samples = self.resampler.process(micros, samples)  # Time in seconds
+        if len(t) == 0:
+            return
+
+        output = self.pipeline.process_block(t, samples[0, :], samples[1, :])
+
+        columns = np.vstack((t, output))
+        self.history.write(columns)
+
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(columns)
+
+        now = time.perf_counter()
+        if now - self.last_publish >= self.FRAME_TIME:  # Limit update rate
+            if self.on_state is not None:
+                self.on_state(self.pipeline.dynamics_model.angle, self.pipeline.target)
+            self.last_publish = now
@@ -0,0 +1,119 @@
+"""Grid search over the parameters of the dynamics model.
+
+Run from the root of the repository on a recording made by the GUI, e.g.:
+
+    python -m pipeline.sweep data/MVC_11-31_14-06-2024.csv --inertia 0.5 1 2
+
+The filtered EMG of the recording is fed to the muscle model and a dynamics model
+for every combination of parameters, all advanced together. The combinations are
+ranked by how closely their angle follows the angle in the recording.
+"""
+
+import argparse
+import itertools
+import time
+import numpy as np
+from typing import Optional
+
+from pipeline.csv_loader import load_columns
+from pipeline.model_pipeline import MuscleModel
+from pipeline.recording_file import RecordingFile, is_recording_file
+from simulator.dynamics_model import DynamicsModel, DynamicsModelArray
+
+
+def load_output(filename: str) -> np.ndarray:
+    """Load all output channels of a recording made by the GUI.
+
+    :param filename: Path to the recording (`.npz`, `.csv` with header or binary)
+    :return: Channels, shape (6, n), see `ModelPipeline.CHANNELS`
+    """
+
+    if is_recording_file(filename):
+        return np.array(RecordingFile(filename).data)
+
+    if filename.lower().endswith('.npz'):
+        with np.load(filename) as file:
+            return file['data'].astype(float)
+
+    return np.array(load_columns(filename)[1:, :])
+
+
+def sweep_dynamics(emg1: np.ndarray, emg2: np.ndarray, dynamics: DynamicsModelArray,
+                   muscle_model: Optional[MuscleModel] = None,
+                   reference: Optional[np.ndarray] = None) -> np.ndarray:
+    """Run all dynamics models of an array on the same filtered EMG.
+
+    Each model gets the torque of the muscle model at its own angle.
+
+    :param emg1: Filtered EMG (channel 0), shape (n,)
+    :param emg2: Filtered EMG (channel 1), shape (n,)
+    :param dynamics: Models to advance, they keep their final state
+    :param muscle_model: Muscle model to use (a new one when `None`)
+    :param reference: Angle to compare with, shape (n,)
+    :return: Angles of all models, shape (models, n), or the RMS difference of each
+        model with the reference when given, shape (models,)
+    """
+
+    if muscle_model is None:
+        muscle_model = MuscleModel()
+
+    if reference is None:
+        angles = np.zeros((len(dynamics), len(emg1)))
+    else:
+        squared_error = np.zeros(len(dynamics))
+
+    for i, (e1, e2) in enumerate(zip(emg1.tolist(), emg2.tolist())):
+        torque = muscle_model.update_batch(dynamics.angle, e1, e2)
+        angle = dynamics.update(torque)
+
+        if reference is None:
+            angles[:, i] = angle
+        else:
+            squared_error += (angle - reference[i]) ** 2
+
+    if reference is None:
+        return angles
+
+    return np.sqrt(squared_error / max(len(emg1), 1))
+
+
+def main():
+    default = DynamicsModel(1.0 / MuscleModel.FS)
+
+    parser = argparse.ArgumentParser(description='Try combinations of dynamics '
+                                                 'parameters on a recording made by '
+                                                 'the GUI, ranked by the RMS error of '
+                                                 'the angle.')
+    parser.add_argument('input', help='Recording (.csv with header, .npz or .bin)')
+    parser.add_argument('--inertia', type=float, nargs='+', default=[default.inertia],
+                        help='Inertia values [kg m^2]')
+    parser.add_argument('--damping', type=float, nargs='+', default=[default.damping],
+                        help='Damping values')
+    parser.add_argument('--friction', type=float, nargs='+',
+                        default=[default.static_friction],
+                        help='Static friction values [Nm]')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of best combinations to show')
+    args = parser.parse_args()
+
+    data = load_output(args.input)
+
+    grid = np.array(list(itertools.product(args.inertia, args.damping, args.friction)))
+    dynamics = DynamicsModelArray(default.dt, grid[:, 0], grid[:, 1], grid[:, 2],
+                                  default.friction_velocity, default.lim_min,
+                                  default.lim_max)
+
+    start = time.perf_counter()
+    errors = sweep_dynamics(data[0, :], data[1, :], dynamics, reference=data[3, :])
+    duration = time.perf_counter() - start
+
+    print('Evaluated {} combinations on {} samples in {:.2f} s'.format(
+        len(grid), data.shape[1], duration))
+    print('{:>12} {:>12} {:>12} {:>12}'.format('inertia', 'damping', 'friction',
+                                               'RMS [deg]'))
+    for i in np.argsort(errors)[:args.top]:
+        print('{:12.6g} {:12.6g} {:12.6g} {:12.4f}'.format(*grid[i], errors[i]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import math
+import numpy as np
+from typing import Sequence
+
+from pipeline.sample_ring import SampleRing
+
+
+class TieredHistory:
+    """History of a session at multiple resolutions.
+
+    The most recent samples are kept at full rate in a `SampleRing`. Older data is
+    kept in levels of increasingly coarser buckets: every bucket of a level
+    combines `factor` buckets of the level below, storing the time of its first
+    sample and the minimum, maximum and mean of each channel. All levels are
+    updated incrementally as blocks come in, so a long session fits in a few
+    megabytes while recent data stays at full resolution.
+
+    The rows of a level are the time, followed by the minima, the maxima and the
+    means of all channels.
+    """
+
+    LEVEL_MARGIN = 64  # Extra buckets per level, so views stay valid during writes
+
+    def __init__(self, recent: SampleRing, recent_size: int, sample_rate: float,
+                 factor: int = 16, level_times: Sequence[float] = (120.0, 1200.0, 14400.0)):
+        """
+
+        :param recent: Ring for the full-rate samples (time plus channels)
+        :param recent_size: Number of full-rate samples that are read from `recent`
+        :param sample_rate: Rate of the full-rate samples [Hz]
+        :param factor: Number of buckets combined into a bucket of the next level
+        :param level_times: Duration kept by each coarser level [s]
+        """
+
+        self.recent = recent
+        self.recent_size = recent_size
+        self.sample_rate = sample_rate
+        self.factor = factor
+        self.channels = recent.rows - 1
+
+        self.bucket_times = [factor ** (k + 1) / sample_rate
+                             for k in range(len(level_times))]
+        self.sizes = [max(1, int(math.ceil(duration / bucket_time)))
+                      for duration, bucket_time in zip(level_times, self.bucket_times)]
+        self.levels = [SampleRing(1 + 3 * self.channels, size + self.LEVEL_MARGIN)
+                       for size in self.sizes]
+
+        # Inputs of the unfinished bucket of each level, (time, min, max, mean)
+        self._pending = [None] * len(self.levels)
+
+    def nbytes(self) -> int:
+        """Memory used by the sample buffers."""
+        return self.recent.buffer.nbytes + sum(level.buffer.nbytes for level in self.levels)
+
+    def write(self, columns: np.ndarray):
+        """Add full-rate samples (writer only).
+
+        :param columns: Time and channels, shape (1 + channels, n), oldest first
+        """
+
+        self.recent.write(columns)
+
+        values = columns[1:, :]
+        self._reduce(0, columns[0, :], values, values, values)
+
+    def _reduce(self, level: int, time: np.ndarray, mins: np.ndarray, maxs: np.ndarray,
+                means: np.ndarray):
+        """Combine buckets (or samples) into the buckets of `level`."""
+
+        if level >= len(self.levels):
+            return
+
+        pending = self._pending[level]
+        if pending is not None:
+            time = np.concatenate((pending[0], time))
+            mins = np.hstack((pending[1], mins))
+            maxs = np.hstack((pending[2], maxs))
+            means = np.hstack((pending[3], means))
+
+        full = time.size - time.size % self.factor
+        if full < time.size:
+            self._pending[level] = (time[full:].copy(), mins[:, full:].copy(),
+                                    maxs[:, full:].copy(), means[:, full:].copy())
+        else:
+            self._pending[level] = None
+
+        if full == 0:
+            return
+
+        shape = (self.channels, full // self.factor, self.factor)
+        time = time[0:full:self.factor]
+        mins = np.min(mins[:, :full].reshape(shape), axis=2)
+        maxs = np.max(maxs[:, :full].reshape(shape), axis=2)
+        means = np.mean(means[:, :full].reshape(shape), axis=2)
+
+        self.levels[level].write(np.vstack((time, mins, maxs, means)))
+
+        self._reduce(level + 1, time, mins, maxs, means)
+
+    def level_data(self, level: int) -> np.ndarray:
+        """Get a view of the stored data of a level.
+
+        :param level: 0 for the full-rate samples, 1 and up for the coarser levels
+        :return: Time and channels for level 0, otherwise time, minima, maxima and
+            means (see class description)
+        """
+
+        if level == 0:
+            return self.recent.latest(self.recent_size)
+
+        return self.levels[level - 1].latest(self.sizes[level - 1])
+
+    def time_range(self) -> (float, float):
+        """Get the time of the oldest and of the newest stored sample.
+
+        :return: Oldest and newest time, both `nan` when the history is empty
+        """
+
+        newest = self.level_data(0)
+        if newest.shape[1] == 0:
+            return math.nan, math.nan
+
+        oldest = newest[0, 0]
+        for level in range(1, len(self.levels) + 1):
+            data = self.level_data(level)
+            if data.shape[1] > 0:
+                oldest = min(oldest, data[0, 0])
+
+        return oldest, newest[0, -1]
+
+    def envelope(self, t_start: float, t_stop: float, width: int) -> np.ndarray:
+        """Get a min/max envelope of a time window, for plotting.
+
+        The finest level that still holds `t_start` is used, or a coarser one when
+        its buckets are still smaller than a pixel. The result is reduced further
+        to about one bucket per pixel.
+
+        :param t_start: Start of the window [s]
+        :param t_stop: End of the window [s]
+        :param width: Number of horizontal pixels available
+        :return: Time and channels with the minimum and maximum of each bucket
+            interleaved, shape (1 + channels, m)
+        """
+
+        width = max(width, 1)
+        pixel_time = (t_stop - t_start) / width
+
+        oldest, _ = self.time_range()
+        if not math.isnan(oldest):
+            t_start = max(t_start, oldest)  # Nothing is stored before the oldest sample
+
+        level = None
+        for k in range(len(self.levels) + 1):
+            data = self.level_data(k)
+            if data.shape[1] == 0:
+                continue
+
+            level = k  # The coarsest level with data when none is old enough
+            if data[0, 0] <= t_start:
+                break
+
+        if level is None:
+            return np.zeros((1 + self.channels, 0))
+
+        # Coarser levels are cheaper as long as their buckets are below a pixel
+        while level < len(self.levels) and self.bucket_times[level] <= pixel_time:
+            data = self.level_data(level + 1)
+            if data.shape[1] == 0 or data[0, 0] > t_start:
+                break
+            level += 1
+
+        data = self.level_data(level)
+        first, last = np.searchsorted(data[0, :], [t_start, t_stop], side='right')
+        first = max(first - 1, 0)  # Include the bucket that contains `t_start`
+        data = data[:, first:last]
+
+        c = self.channels
+        time = data[0, :]
+        if level == 0:
+            mins = maxs = data[1:, :]
+        else:
+            mins = data[1:(1 + c), :]
+            maxs = data[(1 + c):(1 + 2 * c), :]
+
+        group = -(-time.size // width)  # Ceiling division
+        if group >= 2:
+            starts = np.arange(0, time.size, group)
+            time = time[starts]
+            mins = np.minimum.reduceat(mins, starts, axis=1)
+            maxs = np.maximum.reduceat(maxs, starts, axis=1)
+
+        output = np.zeros((1 + c, 2 * time.size))
+        output[0, 0::2] = time
+        output[0, 1::2] = time
+        output[1:, 0::2] = mins
+        output[1:, 1::2] = maxs
+
+        return output
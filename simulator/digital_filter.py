@@ -42,3 +42,154 @@ class DigitalFilter:
         if isinstance(y, np.ndarray):
             return y[0]
         return float(y)
+
+    def sample_block(self, x: np.ndarray) -> np.ndarray:
+        """Filter a block of consecutive samples in a single call.
+
+        The filter state is carried over, so the output is identical to calling
+        `sample()` for each value in turn. Blocks and single samples can be mixed
+        freely on the same filter.
+
+        :param x: New values (1D array, oldest sample first)
+        :return: Filtered values, same length as `x`
+        """
+
+        x = np.asarray(x, dtype=float)
+        if x.size == 0:
+            return np.zeros(0)
+
+        y, self.z = signal.lfilter(self.b, self.a, x, zi=self.z)
+
+        return y
+
+
+class MultiChannelFilter:
+    """Digital filter that runs the same coefficients over several signals at once.
+
+    The filter state is a 2D array with one row per channel, so all channels are
+    advanced by a single scipy call. Use this instead of a `DigitalFilter` per
+    signal when multiple signals need identical filtering.
+    """
+
+    def __init__(self, b: list, a: list, channels: int):
+        """
+        Use a scipy.signal function to compute your desired filter coefficients.
+
+        :param b: Numerator coefficients
+        :param a: Denominator coefficients
+        :param channels: Number of signals that are filtered in parallel
+        """
+
+        self.b = b
+        self.a = a
+        self.channels = channels
+
+        # Zero state with the right size, one row per channel (see `DigitalFilter`)
+        zi = signal.lfilter_zi(self.b, self.a)
+        self.z = np.zeros((channels, zi.size))
+
+    def sample(self, x) -> np.ndarray:
+        """Filter one more sample of each channel.
+
+        :param x: New values, one per channel
+        :return: Filtered values, one per channel
+        """
+
+        x = np.asarray(x, dtype=float).reshape(self.channels, 1)
+
+        y, self.z = signal.lfilter(self.b, self.a, x, axis=1, zi=self.z)
+
+        return y[:, 0]
+
+    def sample_block(self, x: np.ndarray) -> np.ndarray:
+        """Filter a block of consecutive samples of each channel.
+
+        Output is identical to calling `sample()` for each column in turn.
+
+        :param x: New values, shape (channels, n), oldest sample first
+        :return: Filtered values, shape (channels, n)
+        """
+
+        x = np.asarray(x, dtype=float).reshape(self.channels, -1)
+        if x.shape[1] == 0:
+            return np.zeros((self.channels, 0))
+
+        y, self.z = signal.lfilter(self.b, self.a, x, axis=1, zi=self.z)
+
+        return y
+
+
+class FilterCascade:
+    """Chain of filters in second-order-sections form, with nonlinear breakpoints.
+
+    Consecutive linear stages are stacked into a single SOS matrix and run with one
+    `scipy.signal.sosfilt` call. Nonlinear stages (e.g. a rectifier) split the chain
+    into such linear segments. SOS form is numerically more robust than `(b, a)`
+    coefficients, especially for low cut-off frequencies.
+
+    Scalars, blocks and multiple channels are supported. Like the other filters,
+    the state is stored inside the object, one state per channel.
+    """
+
+    def __init__(self, stages: list, channels: int = 1):
+        """
+        Create the SOS matrices with e.g. `signal.butter(..., output='sos')` or
+        convert `(b, a)` coefficients with `signal.tf2sos(b, a)`.
+
+        :param stages: List of SOS matrices (shape (sections, 6)) and element-wise
+            functions (e.g. `np.abs`), in order of application
+        :param channels: Number of signals that are filtered in parallel
+        """
+
+        self.channels = channels
+
+        # Each segment is either an SOS matrix or a callable
+        self.segments = []
+        for stage in stages:
+            if callable(stage):
+                self.segments.append(stage)
+            elif self.segments and not callable(self.segments[-1]):
+                self.segments[-1] = np.vstack((self.segments[-1], stage))  # Fuse
+            else:
+                self.segments.append(np.atleast_2d(np.asarray(stage, dtype=float)))
+
+        # Filter state per linear segment, shape (sections, channels, 2)
+        self.z = [None if callable(segment) else
+                  np.zeros((segment.shape[0], channels, 2))
+                  for segment in self.segments]
+
+    def sample(self, x):
+        """Filter one more sample of each channel.
+
+        :param x: New value (scalar for a single channel, else one per channel)
+        :return: Filtered value (scalar for a single channel, else one per channel)
+        """
+
+        y = self.sample_block(np.reshape(x, (self.channels, 1)))[:, 0]
+
+        if self.channels == 1:
+            return float(y[0])
+        return y
+
+    def sample_block(self, x: np.ndarray) -> np.ndarray:
+        """Filter a block of consecutive samples of each channel.
+
+        Output is identical to calling `sample()` for each sample in turn.
+
+        :param x: New values, shape (n,) for a single channel or (channels, n)
+        :return: Filtered values, same shape as `x`
+        """
+
+        x = np.asarray(x, dtype=float)
+        shape = x.shape
+        y = x.reshape(self.channels, -1)
+        if y.shape[1] == 0:
+            return np.zeros(shape)
+
+        for i, segment in enumerate(self.segments):
+            if callable(segment):
+                y = segment(y)
+            else:
+                y, self.z[i] = signal.sosfilt(segment, y, axis=1, zi=self.z[i])
+
+        return y.reshape(shape)
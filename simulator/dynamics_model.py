@@ -1,27 +1,56 @@
+import numpy as np
+
+
 class DynamicsModel:
     """Model of the dynamics of the hand.
 
     Students will edit the inertia and damping of the muscle model in this script. 
     
-    The muscle_model is integrated with simple Euler on each `update()`.
+    The model is integrated on each `update()` with one of the `INTEGRATORS`:
+
+     * `'semi_implicit'`: semi-implicit Euler (the velocity is updated first)
+     * `'rk4'`: fourth order Runge-Kutta, more accurate for larger steps
+     * `'adaptive'`: RK4 with an error-controlled step size, which takes large
+       steps in smooth motion and refines around friction switches and the limits
 
     A positive angle means flexion (the palm is lowered, towards the elbow).
     """
 
-    def __init__(self, dt: float):
+    INTEGRATORS = ('semi_implicit', 'rk4', 'adaptive')
+
+    def __init__(self, dt: float, integrator: str = 'semi_implicit',
+                 max_step: float = None, min_step: float = 1.0e-5,
+                 tolerance: float = 1.0e-4):
         """
 
         :param dt: Model time step
+        :param integrator: Integration method, one of `INTEGRATORS`
+        :param max_step: Largest substep of the adaptive integrator (a whole update
+            when `None`)
+        :param min_step: Smallest substep of the adaptive integrator, also the
+            precision with which it locates the limits
+        :param tolerance: Error allowed per substep of the adaptive integrator [deg]
         """
+
+        if integrator not in self.INTEGRATORS:
+            raise ValueError('Unknown integrator `{}`'.format(integrator))
+
         self._angle = 0
         self._velocity = 0
         self._dt = dt
 
+        self.integrator = integrator
+        self.max_step = max_step
+        self.min_step = min_step
+        self.tolerance = tolerance
+        self._step = None  # Substep size the adaptive integrator continues with
+
         # Consider the hand as a rod of equally distributed mass
         # Not a great assumption, but the order of magnitude should be okay
         self.mass = 0.3  # [kg], from: https://exrx.net/Kinesiology/Segments
-        self.length = 0.10  # [m], 0.19m from:
-        # https://www.researchgate.net/figure/Measurements-cm-of-hand-length-in-males-and-females_tbl1_257737146
+        self.length = 0.10  # [m], 0.19m from (URL split over two lines):
+        # https://www.researchgate.net/figure/
+        #   Measurements-cm-of-hand-length-in-males-and-females_tbl1_257737146
         # but we reduce it a bit because the center of mass will be close to the wrist
 
         inertiaValue = 1.0
@@ -33,21 +62,219 @@ class DynamicsModel:
         self.damping = dampingValue  
 
         self.static_friction = 0.07  # [Nm], some static friction to prevent coasting
+        self.friction_velocity = 0.1  # Friction only applies above this speed
+
+        self.lim_min = -69  # Angle limits
+        self.lim_max = 69
 
-    def update(self, torque: float) -> float:
+    def update(self, torque: float, dt: float = None) -> float:
         """
 
-        :param torque: Input torque [Nm]
+        :param torque: Input torque [Nm], held constant during the step
+        :param dt: Length of this step (the model time step when `None`)
         :return: New angle
         """
 
-        # Compute static friction:
+        if dt is None:
+            dt = self._dt
+
+        if self.integrator == 'semi_implicit':
+            self._velocity, self._angle = self.semi_implicit_step(torque, dt)
+        elif self.integrator == 'rk4':
+            self._velocity, self._angle = self.rk4_step(torque, dt)
+        else:
+            self.adaptive_steps(torque, dt)
+            return self._angle
+
+        self.apply_limits()
+
+        return self._angle
+
+    def friction(self, velocity: float) -> float:
+        """Static friction at a velocity."""
+
+        if velocity > self.friction_velocity:
+            return self.static_friction
+        elif velocity < -self.friction_velocity:
+            return -self.static_friction
+        return 0
+
+    def acceleration(self, torque: float, velocity: float) -> float:
+        return (torque - self.friction(velocity) - self.damping * velocity) / self.inertia
+
+    def apply_limits(self):
+        """Stop the hand at the angle limits."""
+
+        if self._angle < self.lim_min:
+            self._angle = self.lim_min
+            self._velocity = 0.0
+        if self._angle > self.lim_max:
+            self._angle = self.lim_max
+            self._velocity = 0.0
+
+    def semi_implicit_step(self, torque: float, dt: float) -> (float, float):
+        """Step with semi-implicit (symplectic) Euler, the position uses the new
+        velocity.
+
+        :return: New velocity and angle, without limits
+        """
+
+        velocity = self._velocity + self.acceleration(torque, self._velocity) * dt
+        return velocity, self._angle + velocity * dt
+
+    def rk4_step(self, torque: float, dt: float, velocity: float = None,
+                 angle: float = None) -> (float, float):
+        """Step with the classic fourth order Runge-Kutta method.
+
+        :param velocity: Velocity to start from (the current one when `None`)
+        :param angle: Angle to start from (the current one when `None`)
+        :return: New velocity and angle, without limits
+        """
+
+        if velocity is None:
+            velocity, angle = self._velocity, self._angle
+
+        v1 = velocity
+        a1 = self.acceleration(torque, v1)
+        v2 = v1 + 0.5 * dt * a1
+        a2 = self.acceleration(torque, v2)
+        v3 = v1 + 0.5 * dt * a2
+        a3 = self.acceleration(torque, v3)
+        v4 = v1 + dt * a3
+        a4 = self.acceleration(torque, v4)
+
+        velocity = v1 + dt / 6.0 * (a1 + 2.0 * a2 + 2.0 * a3 + a4)
+        angle = angle + dt / 6.0 * (v1 + 2.0 * v2 + 2.0 * v3 + v4)
+
+        return velocity, angle
+
+    def adaptive_steps(self, torque: float, dt: float):
+        """Integrate with RK4 and an error-controlled substep size.
+
+        Each substep is compared with two substeps of half the size (step
+        doubling). When the two differ by more than `tolerance`, the substep is
+        retried smaller. Otherwise the result of the half substeps is kept and the
+        next substep may grow. The size carries over to the next update, so in
+        smooth motion an update is a single substep.
+
+        Friction switches on and off with the velocity, the error control refines
+        the substeps around those switches. A substep that crosses an angle limit
+        is halved until the crossing is located within `min_step`.
+        """
+
+        max_step = dt if self.max_step is None else self.max_step
+
+        h = max_step if self._step is None else self._step
+        remaining = dt
+        while remaining > 0.0:
+            h = max(min(h, remaining, max_step), min(self.min_step, remaining))
+
+            while True:
+                velocity, angle = self.rk4_step(torque, h)
+                half_velocity, half_angle = self.rk4_step(torque, 0.5 * h)
+                half_velocity, half_angle = self.rk4_step(torque, 0.5 * h,
+                                                          half_velocity, half_angle)
+
+                # Angle error, velocity errors count for their effect within the step
+                error = max(abs(half_angle - angle), abs(half_velocity - velocity) * h)
+
+                inside = self.lim_min < half_angle < self.lim_max
+                if not inside and not self.lim_min < self._angle < self.lim_max:
+                    break  # Pushing against a limit, the hand stays there
+
+                if h <= self.min_step or inside and error <= self.tolerance:
+                    break
+                elif not inside:
+                    h = max(0.5 * h, self.min_step)
+                else:
+                    h = max(h * max(0.2, 0.9 * (self.tolerance / error) ** 0.2),
+                            self.min_step)
+
+            self._velocity, self._angle = half_velocity, half_angle
+            self.apply_limits()
+            remaining -= h
 
-        friction = 0
-        if self._velocity > 0.1:
-            friction = self.static_friction
-        elif self._velocity < -0.1:
-            friction = -self.static_friction
+            # Grow the next substep, as far as the error allows
+            if error > 0.0:
+                h *= min(4.0, 0.9 * (self.tolerance / error) ** 0.2)
+            else:
+                h *= 4.0
+
+        self._step = h
+
+    @property
+    def angle(self) -> float:
+        return self._angle
+
+    @property
+    def velocity(self) -> float:
+        return self._velocity
+
+    @property
+    def dt(self) -> float:
+        return self._dt
+
+
+class DynamicsModelArray:
+    """Many independent models of the hand, advanced together.
+
+    Every model has its own inertia, damping, friction and limits, given as arrays
+    (or scalars shared by all models). All models are advanced in one vectorized
+    step, with the same friction and limit rules as `DynamicsModel`. Use this to
+    try many parameter combinations on the same recording at once.
+    """
+
+    def __init__(self, dt: float, inertia, damping, static_friction,
+                 friction_velocity=0.1, lim_min=-69.0, lim_max=69.0):
+        """
+
+        :param dt: Model time step
+        :param inertia: Inertia of each model [kg m^2]
+        :param damping: Damping of each model
+        :param static_friction: Static friction of each model [Nm]
+        :param friction_velocity: Speed above which friction applies
+        :param lim_min: Lower angle limit of each model
+        :param lim_max: Upper angle limit of each model
+        """
+
+        self._dt = dt
+
+        (self.inertia, self.damping, self.static_friction, self.friction_velocity,
+         self.lim_min, self.lim_max) = (np.array(value, dtype=float) for value in
+                                        np.broadcast_arrays(inertia, damping,
+                                                            static_friction,
+                                                            friction_velocity,
+                                                            lim_min, lim_max))
+
+        self._angle = np.zeros(self.inertia.shape)
+        self._velocity = np.zeros(self.inertia.shape)
+
+    @classmethod
+    def from_model(cls, model: DynamicsModel, count: int = 1):
+        """Create copies of the parameters of a single model.
+
+        :param model: Model to copy the parameters (not the state) from
+        :param count: Number of models
+        """
+
+        return cls(model.dt, np.full(count, model.inertia), model.damping,
+                   model.static_friction, model.friction_velocity, model.lim_min,
+                   model.lim_max)
+
+    def __len__(self) -> int:
+        return self.inertia.size
+
+    def update(self, torque) -> np.ndarray:
+        """
+
+        :param torque: Input torque of each model (or one for all) [Nm]
+        :return: New angles
+        """
+
+        friction = np.where(self._velocity > self.friction_velocity,
+                            self.static_friction, 0.0)
+        friction = np.where(self._velocity < -self.friction_velocity,
+                            -self.static_friction, friction)
 
         acceleration = (torque - friction -
                         self.damping * self._velocity) / self.inertia
@@ -56,21 +283,20 @@ class DynamicsModel:
         self._angle += self._velocity * self._dt
 
         # Angle limits:
-        lim_min = -69
-        lim_max = 69
-        if self._angle < lim_min:
-            self._angle = lim_min
-            self._velocity = 0.0
-        if self._angle > lim_max:
-            self._angle = lim_max
-            self._velocity = 0.0
+        limited = (self._angle < self.lim_min) | (self._angle > self.lim_max)
+        np.clip(self._angle, self.lim_min, self.lim_max, out=self._angle)
+        self._velocity[limited] = 0.0
 
         return self._angle
 
     @property
-    def angle(self) -> float:
+    def angle(self) -> np.ndarray:
         return self._angle
 
     @property
-    def velocity(self) -> float:
+    def velocity(self) -> np.ndarray:
         return self._velocity
+
+    @property
+    def dt(self) -> float:
+        return self._dt
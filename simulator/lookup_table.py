@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class LookupTable:
+    """Uniformly sampled version of a 1D function, for fast evaluation.
+
+    The function is evaluated once on a dense, uniform grid. Calling the table
+    then only takes an index computation and a linear interpolation between two
+    neighbouring grid points, instead of evaluating e.g. a scipy spline.
+
+    Vector-valued functions are supported too (e.g. a spline through a stack of
+    curves), as long as the grid is along the last axis of the function output.
+
+    Inputs outside of the grid are clamped to the first or last value.
+    """
+
+    MAX_POINTS = 1000000  # Upper limit to the grid size when refining
+
+    def __init__(self, function, x_min: float, x_max: float, resolution: float,
+                 tolerance: float = None):
+        """
+        The table is refined until the interpolation error is within `tolerance`,
+        checked halfway between grid points (where the error of linear
+        interpolation is largest).
+
+        :param function: Vectorized function to sample (e.g. a `PchipInterpolator`)
+        :param x_min: Start of the grid
+        :param x_max: End of the grid
+        :param resolution: Initial grid step
+        :param tolerance: Maximum error, relative to the largest absolute function
+            value on the grid (per curve for vector-valued functions, skip the
+            check when `None`)
+        """
+
+        if x_max <= x_min or resolution <= 0.0:
+            raise ValueError('Invalid lookup table range or resolution')
+
+        self.x_min = float(x_min)
+        self.x_max = float(x_max)
+
+        points = int(np.ceil((self.x_max - self.x_min) / resolution)) + 1
+
+        while True:
+            x = np.linspace(self.x_min, self.x_max, max(points, 2))
+            y = np.asarray(function(x), dtype=float)
+
+            if tolerance is None:
+                break
+
+            x_mid = 0.5 * (x[:-1] + x[1:])
+            y_mid = np.asarray(function(x_mid), dtype=float)
+            error = np.abs(y_mid - 0.5 * (y[..., :-1] + y[..., 1:]))
+            scale = np.maximum(np.max(np.abs(y), axis=-1, keepdims=True),
+                               np.finfo(float).tiny)
+            self.error = np.max(error / scale)
+            if self.error <= tolerance:
+                break
+
+            points = 2 * points - 1  # Halve the step, keep the existing points
+            if points > self.MAX_POINTS:
+                raise ValueError('Lookup table could not reach a relative error of '
+                                 '{} (got {})'.format(tolerance, self.error))
+
+        self.x = x
+        self.y = y
+        self.step = (self.x_max - self.x_min) / (x.size - 1)
+        self._inv_step = 1.0 / self.step
+        self._last = x.size - 1
+        self._slope = np.diff(y, axis=-1)  # Difference to the next grid point
+        # Python floats are quicker for scalar lookups
+        self._values = y.tolist() if y.ndim == 1 else None
+        self._slopes = self._slope.tolist() if y.ndim == 1 else None
+
+    def __call__(self, x):
+        """Evaluate the table.
+
+        :param x: Scalar or array input
+        :return: Interpolated value(s), same shape as `x` (prefixed by the output
+            shape for vector-valued functions)
+        """
+
+        if np.ndim(x) == 0:
+            t = (x - self.x_min) * self._inv_step
+            if t <= 0.0:
+                i, t = 0, 0.0
+            elif t >= self._last:
+                i, t = self._last - 1, 1.0
+            else:
+                i = int(t)
+                t -= i
+            if self._values is not None:
+                return self._values[i] + t * self._slopes[i]
+            return self.y[..., i] + t * self._slope[..., i]
+
+        t = (np.asarray(x, dtype=float) - self.x_min) * self._inv_step
+        np.clip(t, 0.0, self._last, out=t)
+        i = t.astype(np.intp)
+        np.minimum(i, self._last - 1, out=i)
+        t -= i
+        return self.y[..., i] + t * self._slope[..., i]
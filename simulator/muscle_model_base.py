@@ -1,4 +1,5 @@
 from scipy.interpolate import CubicSpline, splprep
+import numpy as np
 
 
 class MuscleModelBase:
@@ -7,7 +8,8 @@ class MuscleModelBase:
     The muscle_model will take in filtered EMG and will output a torque that is applied to
     the hand.
 
-    Override the `update()` method to insert your own muscle_model.
+    Override the `update()` method to insert your own muscle_model. Override
+    `update_batch()` too if your model can be evaluated on arrays directly.
     """
 
     FS = 750.0  # EMG sampling rate
@@ -26,6 +28,32 @@ class MuscleModelBase:
         # Extend this class and override this method to add your own model
         return 0.0
 
+    def update_batch(self, angles: np.ndarray, emg1: np.ndarray,
+                     emg2: np.ndarray) -> np.ndarray:
+        """Compute the muscle_model for many samples at once.
+
+        Every element is treated as an independent call to `update()`, so the
+        result must be identical to calling `update()` in a loop. Inputs are
+        broadcast against each other, e.g. a single EMG pair can be combined with
+        an array of angles.
+
+        By default this simply loops over `update()`. Override it with a
+        vectorized version for faster offline analysis.
+
+        :param angles: Angles of the wrist
+        :param emg1: Filtered EMG (channel 0)
+        :param emg2: Filtered EMG (channel 1)
+        :return: Torques [Nm], in the broadcast shape of the inputs
+        """
+
+        angles, emg1, emg2 = np.broadcast_arrays(angles, emg1, emg2)
+
+        torques = np.zeros(angles.shape)
+        for i in np.ndindex(angles.shape):
+            torques[i] = self.update(float(angles[i]), float(emg1[i]), float(emg2[i]))
+
+        return torques
+
 
 class EmgFilterBase:
     """Base class for the EMG filtering.
@@ -33,6 +61,9 @@ class EmgFilterBase:
     The `update()` method will take in unfiltered EMG and should output filtered values.
     Extend this class to and override the `update()` method add your own code.
     The filtered result will be passed on to `MuscleModel`.
+
+    `update_batch()` filters a block of samples at once, override it too if your
+    filters support that (e.g. with `sample_block()`).
     """
 
     FS = MuscleModelBase.FS
@@ -47,3 +78,19 @@ class EmgFilterBase:
         :return: Both filtered values
         """
         return emg1, emg2
+
+    def update_batch(self, emg1: np.ndarray, emg2: np.ndarray) -> (np.ndarray, np.ndarray):
+        """Filter a block of consecutive EMG samples.
+
+        The result must be identical to calling `update()` for each sample in
+        turn. By default this simply loops over `update()`.
+
+        :param emg1: Unfiltered EMG (channel 0), oldest sample first
+        :param emg2: Unfiltered EMG (channel 1), oldest sample first
+        :return: Both filtered signals
+        """
+
+        filtered = np.array([self.update(x1, x2) for x1, x2 in zip(emg1, emg2)],
+                            dtype=float).reshape(-1, 2)
+
+        return filtered[:, 0], filtered[:, 1]
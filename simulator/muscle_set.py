@@ -0,0 +1,167 @@
+from scipy.interpolate import PchipInterpolator
+import numpy as np
+
+from simulator.lookup_table import LookupTable
+
+
+class MuscleSet:
+    """Collection of Hill-type muscles, stored as arrays instead of per-muscle objects.
+
+    Every muscle parameter is a vector with one element per muscle, and the
+    geometry curves (muscle-tendon length and moment arm) of all muscles are
+    stacked into a single interpolator. The forces and moments of all muscles are
+    therefore computed in one vectorized pass, no matter how many muscles there
+    are.
+
+    All muscles share the same normalized active and passive force-length curves
+    and the same grid of joint angles for the geometry.
+
+    Add muscles with `add()`, then use e.g. `torque()`.
+    """
+
+    def __init__(self, angles: list, active_fl, passive_fl):
+        """
+
+        :param angles: Joint angles [rad] at which the geometry of each muscle is given
+        :param active_fl: Normalized active force-length relationship (callable)
+        :param passive_fl: Normalized passive force-length relationship (callable)
+        """
+
+        self.angles = np.asarray(angles, dtype=float)
+        self.active_fl = active_fl
+        self.passive_fl = passive_fl
+
+        self.names = []
+        self.optimal_fibre_length = np.zeros(0)
+        self.max_isometric_force = np.zeros(0)
+        self.pennation_angle_at_optimal = np.zeros(0)
+        self.tendon_slack_length = np.zeros(0)
+        self.emg_channel = np.zeros(0, dtype=int)
+        self.activation_shape = np.zeros(0)
+
+        # Geometry samples, one row per muscle
+        self._muscle_tendon_length_data = np.zeros((0, self.angles.size))
+        self._flexion_moment_arm_data = np.zeros((0, self.angles.size))
+
+        # Stacked interpolators, evaluate to one value per muscle
+        self.muscle_tendon_length = None
+        self.flexion_moment_arm = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, optimal_fibre_length: float, max_isometric_force: float,
+            pennation_angle_at_optimal: float, tendon_slack_length: float,
+            muscle_tendon_length: list, flexion_moment_arm: list,
+            emg_channel: int, activation_shape: float):
+        """Add a muscle to the set.
+
+        :param name: Name of the muscle
+        :param optimal_fibre_length: [m]
+        :param max_isometric_force: [N]
+        :param pennation_angle_at_optimal: [rad]
+        :param tendon_slack_length: [m]
+        :param muscle_tendon_length: Muscle-tendon length [m] at each of `angles`
+        :param flexion_moment_arm: Flexion moment arm [m] at each of `angles`
+        :param emg_channel: Index of the EMG signal that drives this muscle
+        :param activation_shape: Non-linearity factor `A` of the activation (< 0)
+        """
+
+        self.names.append(name)
+        self.optimal_fibre_length = np.append(self.optimal_fibre_length,
+                                              optimal_fibre_length)
+        self.max_isometric_force = np.append(self.max_isometric_force,
+                                             max_isometric_force)
+        self.pennation_angle_at_optimal = np.append(self.pennation_angle_at_optimal,
+                                                    pennation_angle_at_optimal)
+        self.tendon_slack_length = np.append(self.tendon_slack_length,
+                                             tendon_slack_length)
+        self.emg_channel = np.append(self.emg_channel, emg_channel)
+        self.activation_shape = np.append(self.activation_shape, activation_shape)
+
+        self._muscle_tendon_length_data = np.vstack((self._muscle_tendon_length_data,
+                                                     muscle_tendon_length))
+        self._flexion_moment_arm_data = np.vstack((self._flexion_moment_arm_data,
+                                                   flexion_moment_arm))
+
+        self.muscle_tendon_length = PchipInterpolator(
+            self.angles, self._muscle_tendon_length_data, axis=1)
+        self.flexion_moment_arm = PchipInterpolator(
+            self.angles, self._flexion_moment_arm_data, axis=1)
+
+    def build_lookup_tables(self, angle_range: tuple, length_range: tuple,
+                            resolution: float = 1.0e-3, tolerance: float = 1.0e-4):
+        """Replace the interpolators by uniformly sampled lookup tables.
+
+        Add all muscles before calling this, adding another muscle afterwards
+        restores the splines for the geometry.
+
+        :param angle_range: (min, max) angle [rad] of the geometry tables
+        :param length_range: (min, max) normalized length of the force-length tables
+        :param resolution: Initial grid step (in [rad] or normalized length)
+        :param tolerance: Maximum error, relative to the peak value of each curve
+        """
+
+        self.active_fl = LookupTable(self.active_fl, *length_range, resolution,
+                                     tolerance)
+        self.passive_fl = LookupTable(self.passive_fl, *length_range, resolution,
+                                      tolerance)
+        self.muscle_tendon_length = LookupTable(self.muscle_tendon_length, *angle_range,
+                                                resolution, tolerance)
+        self.flexion_moment_arm = LookupTable(self.flexion_moment_arm, *angle_range,
+                                              resolution, tolerance)
+
+    def _per_muscle(self, values: np.ndarray, ndim: int) -> np.ndarray:
+        """Reshape a parameter vector so it broadcasts against samples of `ndim`."""
+        return values.reshape(values.shape + (1,) * ndim)
+
+    def activation(self, emg) -> np.ndarray:
+        """Compute the activation of each muscle.
+
+        :param emg: EMG signals, indexed by channel (scalars or arrays)
+        :return: Activations, shape (muscles, ...)
+        """
+
+        u = np.asarray(emg, dtype=float)[self.emg_channel]
+        A = self._per_muscle(self.activation_shape, u.ndim - 1)
+
+        return (np.exp(A * u) - 1) / (np.exp(A) - 1)
+
+    def muscle_tendon_force(self, activation: np.ndarray, angle) -> np.ndarray:
+        """Compute the muscle-tendon force of each muscle.
+
+        :param activation: Activation of each muscle, shape (muscles, ...)
+        :param angle: Joint angle [rad] (scalar or array)
+        :return: Forces [N], shape (muscles, ...)
+        """
+
+        ndim = np.ndim(angle)
+        lt = self._per_muscle(self.tendon_slack_length, ndim)
+        lo = self._per_muscle(self.optimal_fibre_length, ndim)
+        phi_o = self._per_muscle(self.pennation_angle_at_optimal, ndim)
+        Fmax = self._per_muscle(self.max_isometric_force, ndim)
+
+        lmt = self.muscle_tendon_length(angle)
+        width = lo * np.sin(phi_o)  # Fibre height, constant with pennation
+        lm = np.sqrt(width ** 2 + (lmt - lt) ** 2)
+
+        FA = self.active_fl(lm / lo) * Fmax * activation
+        FP = self.passive_fl(lm / lo) * Fmax
+        Fm = FA + FP
+
+        cos_phi = np.sqrt(1.0 - (width / lm) ** 2)  # cos(arcsin(width / lm))
+
+        return Fm * cos_phi
+
+    def torque(self, angle, emg):
+        """Compute the net flexion torque of all muscles.
+
+        :param angle: Joint angle [rad] (scalar or array)
+        :param emg: EMG signals, indexed by channel (each shaped like `angle`)
+        :return: Torque [Nm], shaped like `angle`
+        """
+
+        activation = self.activation(emg)
+        force = self.muscle_tendon_force(activation, angle)
+
+        return np.sum(force * self.flexion_moment_arm(angle), axis=0)
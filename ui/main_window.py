@@ -1,30 +1,28 @@
-from PyQt5.QtWidgets import QWidget, QMainWindow, QLabel, QCheckBox, \
+from PyQt5.QtWidgets import QWidget, QLabel, QCheckBox, \
     QLineEdit, QPushButton, QMenu, QAction, QMessageBox, QFileDialog, \
-    QVBoxLayout, QHBoxLayout, QFormLayout, QFrame
+    QVBoxLayout, QHBoxLayout, QFormLayout, QScrollBar
 from PyQt5.QtGui import QIntValidator, QDoubleValidator, QIcon, QCloseEvent
-from PyQt5.QtCore import pyqtSlot, QThread
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QThread, QTimer
 import hid
 import pyqtgraph as pg
-import numpy as np
 import json
+import math
 import os
-import time
-import random
 from typing import Optional, List, Tuple
 
 from hid_worker.hid_worker import HIDWorker
+from hid_worker.synthetic_device import SyntheticDevice
+from model_worker.model_worker import ModelWorker
 from simulator.simulator import Simulator
-from simulator.dynamics_model import DynamicsModel
-
-# Try to load user model, fallback on base model
-try:
-    from model.muscle_model import MuscleModel
-except ImportError:
-    from simulator.muscle_model_base import MuscleModelBase as MuscleModel
-try:
-    from model.muscle_model import EmgFilter
-except ImportError:
-    from simulator.muscle_model_base import EmgFilterBase as EmgFilter
+from pipeline.decimation import MinMaxDecimator
+from pipeline.frame_queue import FrameQueue
+from pipeline.model_pipeline import ModelPipeline
+from pipeline.acquisition import find_device
+from pipeline.model_version import model_hash
+from pipeline.recorder import Recorder
+from pipeline.recording_file import EXTENSION, is_recording_file
+from pipeline.replay import save_recording
+from pipeline.tiered_history import TieredHistory
 
 try:
     import ctypes
@@ -43,6 +41,12 @@ class MainWindow(QWidget):
 
     FRAME_TIME = 1.0 / 60.0  # Inverse of framerate
 
+    # Signal to start a new history in the model thread
+    reset_models = pyqtSignal(int)
+
+    # Signal to hand a new recorder (or `None`) to the model thread
+    set_recorder = pyqtSignal(object)
+
     def __init__(self, *args, **kwargs):
         """
 
@@ -55,34 +59,43 @@ class MainWindow(QWidget):
         # Initialize HID USB device (not connected yet)
         self.hid = hid.device()
 
+        # Bounded backlog between the HID and model threads
+        self.backlog_size = 64  # Maximum number of queued blocks
+        self.backlog_policy = 'drop_oldest'  # See `FrameQueue.POLICIES`
+        self.queue = FrameQueue(self.backlog_size, self.backlog_policy)
+
         self.thread = QThread()
-        self.worker = HIDWorker(self.hid)
+        self.worker = HIDWorker(self.hid, queue=self.queue)
         self.worker.moveToThread(self.thread)
-        self.worker.update.connect(self.update_data)  # Link HID reports to local list
         self.thread.started.connect(self.worker.run)  # Start worker with thread
 
+        # The models run in their own thread, fed directly by the HID worker
+        self.model_thread = QThread()
+        self.model_worker = ModelWorker(self.queue)
+        self.model_worker.moveToThread(self.model_thread)
+        self.worker.update.connect(self.model_worker.process_queue)  # Link HID reports
+        self.reset_models.connect(self.model_worker.reset)
+        self.set_recorder.connect(self.model_worker.set_recorder)
+        self.model_worker.state.connect(self.update_state)
+        self.model_worker.channels_error.connect(self.on_channels_error)
+        self.model_thread.start()  # Runs an event loop until the window closes
+
         # Prepare data structure
-        self.channels = 0  # Wait for serial data, resize on the fly
-        self.data: Optional[np.array] = None  # Received data, each row is a channel
-        self.time: Optional[np.array] = None  # Timestamps of each data column
-        self.data_points = 0  # Number of points recorded
+        self.channels = 0  # Number of channels in the model output
         self.data_size = 200  # Number of points in history
         self.render_size = self.data_size  # Number of points shown in graph
-        self.time_offset = None  # Client micros when starting recording
+        self.decimator = MinMaxDecimator()  # Reduces large windows to the plot width
 
         self.overlay = False  # When true, all plots should be combined in one plot
         self.autoscale = True  # Automatic y-scaling when true
         self.y_scale = [-10.0, 10.0]  # Y-scale values when not automatic
 
-        # The system time of the last frame update - Used to limit framerate
-        self.last_update = 0.0
+        # Plots are redrawn at a fixed framerate, independent of the incoming data
+        self.plot_timer = QTimer()
+        self.plot_timer.timeout.connect(self.update_plots)
 
         # Make simulator
         self.simulator = Simulator()
-        self.filter_model = EmgFilter()
-        self.muscle_model = MuscleModel()
-        dt = 1.0 / self.muscle_model.FS
-        self.dynamics_model = DynamicsModel(dt)
 
         # Create property stubs
         self.input_device_name = QLineEdit()
@@ -97,7 +110,12 @@ class MainWindow(QWidget):
             'max': QLineEdit()
         }
         self.layout_plots = pg.GraphicsLayoutWidget()
+        self.scroll_history = QScrollBar(Qt.Horizontal)
         self.button_save = QPushButton('Save')
+        self.button_record = QPushButton('Record')
+        self.label_recording = QLabel()
+        self.recorder: Optional[Recorder] = None  # Recorder in use by the model thread
+        self.label_backlog = QLabel()
 
         self.plots: List[pg.PlotItem] = []  # Start with empty plots
         self.curves: List[pg.PlotDataItem] = []
@@ -142,7 +160,8 @@ class MainWindow(QWidget):
         # Data size
         self.input_size.setValidator(QIntValidator(5, 1000000))
         self.input_size.setText(str(self.data_size))
-        self.input_size.setToolTip('The number of samples that are kept in memory')
+        self.input_size.setToolTip('The number of samples that are kept at full rate, '
+                                   'older samples are kept at a lower resolution')
         layout_settings.addRow(QLabel('Keep samples:'), self.input_size)
 
         # Render size
@@ -195,6 +214,9 @@ class MainWindow(QWidget):
 
         # Plots
         layout_right_plots.addWidget(self.layout_plots)
+        self.scroll_history.setToolTip('Scroll back through the session (the right '
+                                       'end follows the incoming data)')
+        layout_right_plots.addWidget(self.scroll_history)
 
         layout_left.addLayout(layout_right_plots)
 
@@ -207,6 +229,17 @@ class MainWindow(QWidget):
         menu_save.triggered.connect(self.on_save)
         self.button_save.setMenu(menu_save)
         layout_buttons.addWidget(self.button_save)
+        self.button_record.setCheckable(True)
+        self.button_record.setToolTip('Stream all processed frames to a file')
+        self.button_record.setDisabled(True)  # Only while connected
+        self.button_record.toggled.connect(self.on_record_toggle)
+        layout_buttons.addWidget(self.button_record)
+        layout_buttons.addWidget(self.label_recording)
+        layout_buttons.addStretch(0)
+        self.label_backlog.setToolTip('Frames waiting between the HID and the model '
+                                      'thread, and gaps and jitter in the timestamps '
+                                      'of the board')
+        layout_buttons.addWidget(self.label_backlog)
         layout_left.addLayout(layout_buttons)
 
     @pyqtSlot(bool)
@@ -215,14 +248,25 @@ class MainWindow(QWidget):
 
         self.button_port.setText('Disconnect' if checked else 'Connect')
 
+        self.plot_timer.stop()
         self.worker.stop()
         self.thread.quit()
         self.thread.wait()
         self.hid.close()
 
+        # A recording covers a single session, the time starts again when connecting
+        self.button_record.setChecked(False)
+        self.button_record.setDisabled(True)
+
         if checked:
             name = self.input_device_name.text()
-            device_tuple = self.get_hid_device(name)
+            if name == SyntheticDevice.NAME:  # Software device, for testing
+                self.hid = SyntheticDevice()
+                device_tuple = ()
+            else:
+                self.hid = hid.device()
+                device_tuple = self.get_hid_device(name)
+            self.worker.device = self.hid
 
             if device_tuple is None:
                 message = QMessageBox()
@@ -234,7 +278,7 @@ class MainWindow(QWidget):
 
             try:
                 self.hid.open(*device_tuple)
-                self.hid.set_nonblocking(True)
+                self.hid.set_nonblocking(not self.worker.blocking)
             except IOError as err:
                 message = QMessageBox()
                 QMessageBox.warning(message, 'Failed to connect',
@@ -249,13 +293,59 @@ class MainWindow(QWidget):
             self.input_overlay.setDisabled(True)
             self.input_autoscale.setDisabled(True)
             self.start_recording()
+            self.button_record.setDisabled(False)
             self.thread.start()  # Start
+            self.plot_timer.start(int(1000.0 * self.FRAME_TIME))
         else:
             self.input_device_name.setDisabled(False)
             self.input_size.setDisabled(False)
             self.input_overlay.setDisabled(False)
             self.input_autoscale.setDisabled(False)
 
+    @pyqtSlot(bool)
+    def on_record_toggle(self, checked: bool):
+        """When the `record` button is pressed"""
+
+        if not checked:
+            self.stop_recorder()
+            return
+
+        filename, selected = QFileDialog.getSaveFileName(
+            self, 'Record to file', '',
+            'Binary recording (*{});;Comma Separated Values (*.csv)'.format(EXTENSION))
+
+        recorder = None
+        if filename:
+            if selected.startswith('Binary') and not is_recording_file(filename):
+                filename += EXTENSION  # Format is picked by extension
+            recorder = Recorder(filename, ModelPipeline.CHANNELS,
+                                self.model_worker.history.sample_rate, model_hash()[:16])
+            try:
+                recorder.start()
+            except OSError as err:
+                message = QMessageBox()
+                QMessageBox.warning(message, 'Failed to record',
+                                    'The file could not be created.<br>' + str(err),
+                                    QMessageBox.Ok)
+                recorder = None
+
+        if recorder is None:
+            self.button_record.blockSignals(True)
+            self.button_record.setChecked(False)  # Undo toggle
+            self.button_record.blockSignals(False)
+            return
+
+        self.recorder = recorder
+        self.set_recorder.emit(recorder)
+        self.button_record.setText('Stop recording')
+
+    def stop_recorder(self):
+        """Stop the current recorder (the file is finished by the model thread)"""
+
+        self.set_recorder.emit(None)
+        self.recorder = None
+        self.button_record.setText('Record')
+
     @pyqtSlot(bool)
     def on_render_all_toggle(self, checked: bool):
         """Callback for the render-all checkbox"""
@@ -271,6 +361,19 @@ class MainWindow(QWidget):
         for key, input_scale in self.input_scale.items():
             input_scale.setDisabled(checked)
 
+    @pyqtSlot(int)
+    def on_channels_error(self, channels: int):
+        """Callback for blocks with the wrong number of channels"""
+
+        # Disconnect
+        self.button_port.setChecked(False)
+        message = QMessageBox()
+        QMessageBox.warning(message, 'Incorrect number of channels',
+                            'The application expects exactly two channels, '
+                            'but registered {}. Is the correct program running on '
+                            'the board?'.format(channels),
+                            QMessageBox.Ok)
+
     @pyqtSlot(QAction)
     def on_save(self, action: QAction):
         self.save_data(action.text())
@@ -278,19 +381,16 @@ class MainWindow(QWidget):
     @staticmethod
     def get_hid_device(name: str) -> Optional[Tuple[int, int]]:
         """Get the first HID device that matches the provided name."""
-
-        for device_dict in hid.enumerate():
-            if name in device_dict['manufacturer_string']:
-                return device_dict['vendor_id'], device_dict['product_id']
-
-        return None
+        return find_device(name)
 
     def save_data(self, file_format):
         """Save data, file_format is either `csv` or `numpy`"""
 
         file_format = file_format.lower()
 
-        if np.size(self.data, 0) < 3:
+        history = self.model_worker.latest().copy()
+
+        if history.shape[1] < 3:
             message = QMessageBox()
             QMessageBox.information(message, 'Saving data',
                                     'No data recorded yet', QMessageBox.Ok)
@@ -307,16 +407,9 @@ class MainWindow(QWidget):
             options=options)
 
         if filename:
-            if file_format == 'numpy':
-                np.savez(filename, data=self.data, time=self.time)
-            else:
-                data = np.vstack((self.time, self.data))
-                header = 'time [s]'
-                for i in range(self.channels):
-                    header += ', Channel {}'.format(i)
-
-                np.savetxt(filename, data.transpose(), delimiter=';', header=header,
-                           fmt='%f')
+            if file_format == 'numpy' and not filename.lower().endswith('.npz'):
+                filename += '.npz'  # Format is picked by extension
+            save_recording(filename, history[0, :], history[1:, :])
 
     def load_settings(self):
         """Load settings from file"""
@@ -337,6 +430,10 @@ class MainWindow(QWidget):
                     self.input_scale['max'].setText(str(settings['y_scale_max']))
                 if 'y_scale_min' in settings:
                     self.input_scale['min'].setText(str(settings['y_scale_min']))
+                if 'backlog_size' in settings and settings['backlog_size'] > 0:
+                    self.backlog_size = int(settings['backlog_size'])
+                if settings.get('backlog_policy') in FrameQueue.POLICIES:
+                    self.backlog_policy = settings['backlog_policy']
         except FileNotFoundError:
             return  # Do nothing
         except json.decoder.JSONDecodeError:
@@ -351,7 +448,9 @@ class MainWindow(QWidget):
             'overlay': self.overlay,
             'autoscale': self.autoscale,
             'y_scale_min': self.y_scale[0],
-            'y_scale_max': self.y_scale[1]
+            'y_scale_max': self.y_scale[1],
+            'backlog_size': self.backlog_size,
+            'backlog_policy': self.backlog_policy
         }
         with open('settings.json', 'w') as file:
             file.write(json.dumps(settings))
@@ -360,17 +459,18 @@ class MainWindow(QWidget):
         """When main window is closed"""
         self.save_settings()
 
-        self.hid.close()
         self.worker.stop()
         self.thread.quit()
         self.thread.wait()
+        self.hid.close()  # Only once the worker no longer reads from it
+        self.model_thread.quit()
+        self.model_thread.wait()
+        self.model_worker.set_recorder(None)  # Finish the file, the thread is done
 
         super().closeEvent(event)  # Call original method too
 
     def start_recording(self):
         """Called when recording should start (e.g. when `Connect` was hit)"""
-        self.channels = 0  # Force an update on the next data point
-        self.data_points = 0
         self.data_size = int(self.input_size.text())
         self.render_size = int(self.input_render_size.text())
         self.overlay = self.input_overlay.isChecked()
@@ -385,100 +485,89 @@ class MainWindow(QWidget):
         if self.render_size is None or self.render_size > self.data_size:
             self.render_size = self.data_size
 
-    @pyqtSlot(int, list)
-    def update_data(self, micros: int, new_data: list):
-        """Called when new row was received"""
+        # The HID thread is stopped, so no new blocks come in
+        self.queue.clear()
+        self.queue.reset_stats()
+        self.queue.max_blocks = self.backlog_size
+        self.queue.policy = self.backlog_policy
 
-        channels = len(new_data)
-
-        # Perform muscle_model update
-        if channels != 2:
-            # Disconnect
-            self.on_connect_toggle(False)
-            message = QMessageBox()
-            QMessageBox.warning(message, 'Incorrect number of channels',
-                                'The application expects exactly two channels, '
-                                'but registered {}. Is the correct program running on '
-                                'the board?'.format(channels),
-                                QMessageBox.Ok)
+        self.scroll_history.setValue(self.scroll_history.maximum())  # Follow new data
+        self.set_channels(len(ModelPipeline.CHANNELS))
 
-        channels = 6  # Artificially add the EMG, angle, velocity, target and torque channels
+    @pyqtSlot(float, float)
+    def update_state(self, angle: float, target: float):
+        """Called when the model thread publishes a new state of the hand"""
 
-        emg1, emg2, torque = self.update_models(new_data)  # Propagate model stuff
-
-        # Replace data with filtered values and append simulator data
-        new_data = [
-            emg1, emg2, torque, self.dynamics_model.angle, self.simulator.target, self.dynamics_model.velocity
-        ]
+        self.simulator.angle = angle
 
-        if self.channels != channels:
-            self.set_channels(channels)
+        if self.simulator.target != target:
+            self.simulator.target = target
 
-        col = np.array(new_data, dtype=float)
-        self.data = np.roll(self.data, -1, axis=1)  # Rotate backwards
-        self.data[:, -1] = col  # Set new column at the end
+    def update_plots(self):
+        """With data already updated, update plots"""
 
-        if self.time_offset is None:
-            self.time_offset = micros
+        # Read the worker's history once, it may be replaced by a reset
+        tiers = self.model_worker.history
+        n = min(self.render_size, tiers.recent_size)
+        span = n / tiers.sample_rate  # Duration of the window
+        width = self.layout_plots.width()
 
-        self.time = np.roll(self.time, -1)  # Rotate backwards
-        self.time[0, -1] = 1.0e-6 * (micros - self.time_offset)  # Save as seconds
+        if self.update_scroll_range(tiers, span):
+            history = self.decimator.decimate(tiers.recent, n, width)
+        else:
+            t_stop = 1.0e-3 * self.scroll_history.value()
+            history = tiers.envelope(t_stop - span, t_stop, width)
 
-        self.data_points += 1
+        for i, curve in enumerate(self.curves):
+            curve.setData(x=history[0, :], y=history[i + 1, :])
+
+        stats = self.queue.stats()
+        timing = self.model_worker.resampler.stats()
+        self.label_backlog.setText(
+            'Backlog: {} frames (max {}) | Dropped: {} | Worst delay: {:.0f} ms | '
+            'Gaps: {} ({} frames missing, longest {:.0f} ms) | Jitter: {:.0f} us'.format(
+                stats['frames'], stats['max_frames'], stats['dropped_frames'],
+                1000.0 * stats['worst_age'], timing['gaps'], timing['missing_frames'],
+                1000.0 * timing['max_gap'], 1.0e6 * timing['jitter']))
+
+        recorder = self.recorder
+        if recorder is not None:
+            if recorder.error is not None:
+                self.button_record.setChecked(False)
+                message = QMessageBox()
+                QMessageBox.warning(message, 'Recording stopped',
+                                    'Writing to the file failed.<br>'
+                                    + str(recorder.error), QMessageBox.Ok)
+            else:
+                self.label_recording.setText('Recorded: {:.1f} s'.format(
+                    recorder.frames_written / tiers.sample_rate))
 
-        now = time.time()
-        if now - self.last_update >= self.FRAME_TIME:  # Limit update rate
-            self.update_plots()
-            self.last_update = now
+    def update_scroll_range(self, tiers: TieredHistory, span: float) -> bool:
+        """Fit the scroll bar to the stored part of the session.
 
-    def update_models(self, new_data: list) -> (float, float, float):
-        """Update models, called on new data frame
+        The scroll bar holds the end time of the window in milliseconds. When it is
+        at the right end, it keeps following the incoming data.
 
-        :return: Filtered EMG values
+        :return: True when the window follows the incoming data
         """
 
-        emg1, emg2 = self.filter_model.update(new_data[0], new_data[1])
-        old_angle = self.dynamics_model.angle
-        torque = self.muscle_model.update(old_angle, emg1, emg2)
-        angle = self.dynamics_model.update(torque)
+        bar = self.scroll_history
+        live = bar.value() >= bar.maximum()
 
-        self.simulator.angle = angle
-
-        target = self.simulator.target
-
-        # Update target
-        if abs(target - angle) < 5 and abs(self.dynamics_model.velocity) < 10 \
-                or self.simulator.timeout.elapsed() > 10000:
-
-            step = 30
-            if target <= -60:
-                target += step
-            elif target >= 60:
-                target -= step
-            elif random.random() > 0.5:
-                target += step
-            else:
-                target -= step
-
-            self.simulator.target = target
+        oldest, newest = tiers.time_range()
+        if math.isnan(newest):
+            bar.setRange(0, 0)
+            return True
 
-        return emg1, emg2, torque
+        minimum = math.ceil(1000.0 * (oldest + span))  # The window never starts too early
+        bar.setRange(minimum, max(minimum, int(1000.0 * newest)))
+        bar.setPageStep(max(1, int(1000.0 * span)))
+        bar.setSingleStep(max(1, int(100.0 * span)))
 
-    def update_plots(self):
-        """With data already updated, update plots"""
+        if live:
+            bar.setValue(bar.maximum())
 
-        if self.data_points < self.render_size:
-            data_x = self.time[:, -self.data_points:]
-            data_y = self.data[:, -self.data_points:]
-        elif self.render_size < self.data_size:
-            data_x = self.time[:, -self.render_size:]
-            data_y = self.data[:, -self.render_size:]
-        else:
-            data_x = self.time
-            data_y = self.data
-
-        for i, curve in enumerate(self.curves):
-            curve.setData(x=data_x[0, :], y=data_y[i, :])
+        return live
 
     def set_channels(self, channels: int):
         """Resize number of channels
@@ -488,13 +577,7 @@ class MainWindow(QWidget):
         """
 
         self.channels = channels
-        self.data = np.zeros((channels, self.data_size))
-        self.time = np.zeros((1, self.data_size))
-        self.data_points = 0
-
-        self.time_offset = None  # Mark offset to be reset on first read
-
-        self.last_update = 0
+        self.reset_models.emit(self.data_size)
 
         self.create_plots()
 